@@ -1,22 +1,34 @@
 from flask import Flask, render_template, url_for, jsonify, Response, request, redirect, flash, session
 from functools import wraps
-import csv
 import json
 import os
+import threading
 import time
 from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
 try:
     from zoneinfo import ZoneInfo
 except Exception:
     ZoneInfo = None
 
+try:
+    from flask_sock import Sock  # optional: streaming recognition over WebSocket
+except ImportError:
+    Sock = None
+
 from werkzeug.security import check_password_hash, generate_password_hash
 
 import recognizer  # local module controlling webcam recognizer thread
 import registration  # local module for user registration
+import gallery  # on-disk face gallery
+import attendance_store  # indexed attendance records
+import kiosk  # unattended multi-face check-in
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-here-change-in-production')
+# Streaming recognition holds one server thread per open camera, so it is opt-in
+WEBSOCKET_RECOGNITION = os.environ.get('WEBSOCKET_RECOGNITION', '0').lower() in ('1', 'true', 'yes')
+sock = Sock(app) if Sock and WEBSOCKET_RECOGNITION else None
 
 # Default admin credentials (change in production!)
 ADMIN_USERNAME = 'admin'
@@ -24,8 +36,13 @@ ADMIN_DEFAULT_PASSWORD = 'admin123'
 ADMIN_CREDS_PATH = os.path.join(os.path.dirname(__file__), 'config', 'admin_credentials.json')
 ADMIN_PASSWORD_MIN_LENGTH = 8
 
-ATT_DIR = os.path.join(os.path.dirname(__file__), 'Attendance')
+DETECT_BATCH_MAX = int(os.environ.get('DETECT_BATCH_MAX', '10'))  # frames per /detect/batch request
+# Decode uploaded JPEGs at 1/2-1/8 size when the detection profile does not need full resolution
+REDUCED_DECODE = os.environ.get('REDUCED_DECODE', '1').lower() in ('1', 'true', 'yes')
 DEFAULT_TIMEZONE_NAME = 'Asia/Kolkata'
+HISTORY_DEFAULT_DAYS = 30  # date range shown when the history page is opened without one
+HISTORY_PAGE_SIZE = 50
+HISTORY_PAGE_MAX = 500
 
 
 def _fallback_timezone(tz_name):
@@ -173,25 +190,6 @@ def admin_required(f):
     return decorated_function
 
 
-def today_filename():
-    ts = datetime.now(_get_app_timezone())
-    date = ts.strftime('%d-%m-%Y')
-    return f'Attendance_{date}.csv'
-
-
-def read_csv_rows(path):
-    rows = []
-    if not os.path.isfile(path):
-        return rows
-    with open(path, newline='', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        rows = [row for row in reader if row]
-    # strip header if present
-    if rows and rows[0] and rows[0][0].lower() == 'name':
-        rows = rows[1:]
-    return rows
-
-
 @app.context_processor
 def inject_year():
     return {'year': datetime.now(_get_app_timezone()).year}
@@ -223,17 +221,12 @@ def login():
         # Check if user is registered
         import pickle
         base_dir = os.path.dirname(__file__)
-        names_path = os.path.join(base_dir, 'data', 'names.pkl')
         roles_path = os.path.join(base_dir, 'data', 'roles.pkl')
 
         # Load registered names if available
-        if os.path.isfile(names_path):
-            try:
-                with open(names_path, 'rb') as f:
-                    registered_names = list(pickle.load(f))
-            except Exception:
-                registered_names = []
-        else:
+        try:
+            registered_names = gallery.registered_names()
+        except Exception:
             registered_names = []
 
         # Case-insensitive username lookup in registered names
@@ -246,7 +239,7 @@ def login():
             except Exception:
                 continue
 
-        # If not found in names.pkl, check roles.pkl for an admin match
+        # If not found in the gallery, check roles.pkl for an admin match
         if not matched_name and os.path.isfile(roles_path):
             try:
                 with open(roles_path, 'rb') as f:
@@ -360,43 +353,96 @@ def user_dashboard():
 def user_my_attendance():
     username = session.get('username')
     date_str = datetime.now(_get_app_timezone()).strftime('%d-%m-%Y')
-    path = os.path.join(ATT_DIR, today_filename())
     error = None
     my_records = []
 
     try:
-        all_records = read_csv_rows(path)
-        # Filter records for current user
-        my_records = [row for row in all_records if row and row[0] == username]
+        my_records = attendance_store.get_store().day(date_str, name=username)
     except Exception as e:
-        error = f'Failed to read file: {e}'
+        error = f'Failed to read attendance: {e}'
 
     return render_template('user_attendance.html', title='My Attendance', date=date_str, records=my_records, error=error, username=username)
 
 
+def _history_query(args):
+    """Who, which date range and which page an attendance history request asks for.
+
+    Users only ever see their own records; admins may pass ``user``.
+    Dates are YYYY-MM-DD (as sent by <input type="date">). Raises ValueError on bad input.
+    """
+    username = session.get('username')
+    if session.get('role') == 'admin' and args.get('user'):
+        username = args['user']
+    end = args.get('to') or datetime.now(_get_app_timezone()).date().isoformat()
+    end_date = datetime.strptime(end, '%Y-%m-%d').date()
+    start = args.get('from')
+    start_date = (datetime.strptime(start, '%Y-%m-%d').date() if start
+                  else end_date - timedelta(days=HISTORY_DEFAULT_DAYS - 1))
+    if start_date > end_date:
+        raise ValueError('the start date is after the end date')
+    page = max(int(args.get('page', 1)), 1)
+    per_page = min(max(int(args.get('per_page', HISTORY_PAGE_SIZE)), 1), HISTORY_PAGE_MAX)
+    return {"user": username, "from": start_date.isoformat(), "to": end_date.isoformat(),
+            "page": page, "per_page": per_page}
+
+
+def _history_page(query):
+    rows, total = attendance_store.get_store().user_history(
+        query["user"], query["from"], query["to"],
+        limit=query["per_page"], offset=(query["page"] - 1) * query["per_page"])
+    pages = max((total + query["per_page"] - 1) // query["per_page"], 1)
+    return dict(query, records=rows, total=total, pages=pages)
+
+
+@app.route('/user/my-attendance/history')
+@login_required
+def user_attendance_history():
+    error = None
+    try:
+        query = _history_query(request.args)
+    except ValueError as e:
+        error = f'Invalid request: {e}'
+        query = _history_query({'user': request.args.get('user')})
+    try:
+        history = _history_page(query)
+    except Exception as e:
+        error = f'Failed to read attendance: {e}'
+        history = dict(query, records=[], total=0, pages=1)
+    return render_template('user_attendance_history.html', title='Attendance History', error=error, history=history)
+
+
+@app.route('/api/attendance/history')
+@login_required
+def api_attendance_history():
+    """Paginated check-ins for one user over a date range, newest first."""
+    try:
+        query = _history_query(request.args)
+    except ValueError as e:
+        return jsonify({"message": f"Invalid request: {e}"}), 400
+    try:
+        return jsonify(_history_page(query))
+    except Exception as e:
+        print(f"[ERROR] api_attendance_history: {e}")
+        return jsonify({"message": str(e)}), 500
+
+
 @app.route('/attendance/today')
 @admin_required
 def attendance_today():
     date_str = datetime.now(_get_app_timezone()).strftime('%d-%m-%Y')
-    path = os.path.join(ATT_DIR, today_filename())
     error = None
     records = []
     try:
-        records = read_csv_rows(path)
+        records = attendance_store.get_store().day(date_str)
     except Exception as e:
-        error = f'Failed to read file: {e}'
+        error = f'Failed to read attendance: {e}'
     return render_template('attendance_today.html', title='Today', date=date_str, records=records, error=error)
 
 
 @app.route('/attendance/history')
 @admin_required
 def attendance_history():
-    files = []
-    if os.path.isdir(ATT_DIR):
-        for name in os.listdir(ATT_DIR):
-            if name.lower().endswith('.csv') and name.startswith('Attendance_'):
-                files.append(name.replace('Attendance_', '').replace('.csv', ''))
-        files.sort(key=lambda d: datetime.strptime(d, '%d-%m-%Y'), reverse=True)
+    files = [d.strftime('%d-%m-%Y') for d in attendance_store.get_store().dates()]
     return render_template('attendance_history.html', title='History', files=files)
 
 
@@ -404,13 +450,14 @@ def attendance_history():
 @admin_required
 def attendance_by_date(date):
     # expected date format: DD-MM-YYYY
-    path = os.path.join(ATT_DIR, f'Attendance_{date}.csv')
     error = None
     records = []
     try:
-        records = read_csv_rows(path)
+        records = attendance_store.get_store().day(date)
+    except ValueError:
+        error = f'Invalid date {date!r}, expected DD-MM-YYYY'
     except Exception as e:
-        error = f'Failed to read file: {e}'
+        error = f'Failed to read attendance: {e}'
     return render_template('attendance_today.html', title=f'Attendance {date}', date=date, records=records, error=error)
 
 
@@ -419,25 +466,85 @@ def attendance_by_date(date):
 @login_required
 def recognizer_control():
     username = session.get('username')
-    return render_template('recognizer.html', title='Recognizer', username=username)
+    # flask-sock builds an absolute ws:// URL; the page adds its own scheme and host (wss behind HTTPS)
+    ws_url = urlsplit(url_for('recognize_socket')).path if sock else None
+    return render_template('recognizer.html', title='Recognizer', username=username, ws_url=ws_url)
+
+
+def _request_images():
+    """Encoded frames sent with the request.
+
+    Accepts a raw ``image/jpeg`` body, multipart ``image``/``images`` file
+    fields, or the original JSON ``{"image": dataURL}`` / ``{"images": [...]}``.
+    """
+    if request.mimetype.startswith('image/'):
+        body = request.get_data(cache=False)
+        return [body] if body else []
+    if request.files:
+        return [b for b in (f.read() for f in request.files.getlist('images') + request.files.getlist('image')) if b]
+
+    import base64
+    data = request.get_json(silent=True) or {}
+    urls = data.get('images') or ([data['image']] if data.get('image') else [])
+    return [base64.b64decode(url.split(',')[1]) for url in urls]
+
+
+def _decode_frame(img_bytes):
+    """Decode an encoded frame into a BGR image (None on failure), reduced in size if detection allows."""
+    import detection
+    return detection.decode_frame(img_bytes, recognizer.DETECTION_PROFILE if REDUCED_DECODE else None)
+
+
+def _decode_frame_scaled(img_bytes):
+    """``_decode_frame`` plus the factor that maps boxes in the decoded frame back to the upload."""
+    import detection
+    return detection.decode_frame_scaled(img_bytes, recognizer.DETECTION_PROFILE if REDUCED_DECODE else None)
+
+
+def _scale_boxes(items, scale):
+    """Copies of ``items`` with each "box" multiplied by ``scale`` (decoded frame -> uploaded image)."""
+    if scale == 1:
+        return items
+    return [dict(item, box=[v * scale for v in item["box"]]) for item in items]
+
+
+def _detect_response(result, username):
+    """Map a recognizer result onto the JSON schema the camera page expects."""
+    if result.get("attendance_recorded"):
+        return {"match": True, "message": result.get("message", "Attendance recorded")}
+    if result.get("attendance_denied"):
+        # User was recognized but not allowed to mark attendance
+        return {"match": False, "message": result.get("message", "Access denied"), "not_allowed": True}
+    if result.get("recognition_failed"):
+        # Check if camera should be shut down due to security alert
+        if result.get("camera_shutdown"):
+            print(f"[SECURITY] Camera shutdown triggered for user {username}")
+            return {
+                "match": False,
+                "message": result.get("message", "Face not recognized"),
+                "camera_shutdown": True
+            }
+        else:
+            return {"match": False, "message": result.get("message", "Face not recognized")}
+
+    # For intermediate statuses, keep feeding frames
+    return {
+        "match": False,
+        "message": result.get("status", "Recognition in progress")
+    }
 
 
 @app.route('/detect', methods=['POST'])
 @login_required
 def detect():
     try:
-        data = request.get_json()
-        image_data = data['image'].split(',')[1]
+        images = _request_images()
         username = session.get('username')
-
-        import base64
-        import numpy as np
-        import cv2
+        if not images:
+            return jsonify({"match": False, "message": "No image supplied"}), 400
 
         # Decode the image
-        img_bytes = base64.b64decode(image_data)
-        img_arr = np.frombuffer(img_bytes, dtype=np.uint8)
-        frame = cv2.imdecode(img_arr, cv2.IMREAD_COLOR)
+        frame = _decode_frame(images[0])
 
         if frame is None:
             print("[ERROR] Failed to decode image")
@@ -445,51 +552,161 @@ def detect():
 
         # Process the frame
         result = recognizer.recognize_frame(frame, username)
+        response = _detect_response(result, username)
+        response["pace"] = recognizer.pacing_hints(username)
+        return jsonify(response)
+    except Exception as e:
+        print(f"[ERROR] detect: {e}")
+        return jsonify({"match": False, "message": str(e)}), 500
 
-        # Map recognizer responses to the new schema
-        if result.get("attendance_recorded"):
-            return jsonify({"match": True, "message": result.get("message", "Attendance recorded")})
-        if result.get("attendance_denied"):
-            # User was recognized but not allowed to mark attendance
-            return jsonify({"match": False, "message": result.get("message", "Access denied"), "not_allowed": True})
-        if result.get("recognition_failed"):
-            # Check if camera should be shut down due to security alert
-            if result.get("camera_shutdown"):
-                print(f"[SECURITY] Camera shutdown triggered for user {username}")
-                return jsonify({
-                    "match": False,
-                    "message": result.get("message", "Face not recognized"),
-                    "camera_shutdown": True
-                })
-            else:
-                return jsonify({"match": False, "message": result.get("message", "Face not recognized")})
 
-        # For intermediate statuses, keep feeding frames
-        return jsonify({
-            "match": False,
-            "message": result.get("status", "Recognition in progress")
-        })
+@app.route('/detect/batch', methods=['POST'])
+@login_required
+def detect_batch():
+    """Recognize a burst of frames (multipart ``images`` files or {"images": [data URLs]}) in one request.
+
+    Frames are scored together and fed through the confirm/mismatch state
+    in order; the response describes the last frame processed, which is
+    the first final outcome if one was reached.
+    """
+    try:
+        images = _request_images()
+        username = session.get('username')
+        if not images:
+            return jsonify({"match": False, "message": "No images supplied"}), 400
+        if len(images) > DETECT_BATCH_MAX:
+            return jsonify({"match": False, "message": f"At most {DETECT_BATCH_MAX} images per batch"}), 400
+
+        frames = [f for f in (_decode_frame(image) for image in images) if f is not None]
+        if not frames:
+            print("[ERROR] Failed to decode any image in batch")
+            return jsonify({"match": False, "message": "Failed to decode image"}), 500
+
+        results = recognizer.recognize_frames(frames, username)
+        response = _detect_response(results[-1], username)
+        response["frames"] = len(results)
+        response["pace"] = recognizer.pacing_hints(username)
+        return jsonify(response)
     except Exception as e:
-        print(f"[ERROR] detect: {e}")
+        print(f"[ERROR] detect_batch: {e}")
         return jsonify({"match": False, "message": str(e)}), 500
 
 
+@app.route('/detect/group', methods=['POST'])
+@admin_required
+def detect_group():
+    """Group check-in: record attendance for every confidently recognized face in one frame.
+
+    Meant for a door camera run by an admin; takes the same image formats as /detect.
+    """
+    try:
+        images = _request_images()
+        if not images:
+            return jsonify({"message": "No image supplied", "faces": [], "recorded": []}), 400
+        frame, scale = _decode_frame_scaled(images[0])
+        if frame is None:
+            print("[ERROR] Failed to decode image")
+            return jsonify({"message": "Failed to decode image", "faces": [], "recorded": []}), 500
+
+        result = recognizer.recognize_group(frame)
+        if result.get("error"):
+            return jsonify({"message": result["error"], "faces": [], "recorded": []}), 503
+        result["faces"] = _scale_boxes(result["faces"], scale)
+        recorded = result["recorded"]
+        result["message"] = (f"Attendance recorded for {', '.join(recorded)}." if recorded
+                             else result.get("status", f"{len(result['faces'])} face(s), none recorded"))
+        return jsonify(result)
+    except Exception as e:
+        print(f"[ERROR] detect_group: {e}")
+        return jsonify({"message": str(e), "faces": [], "recorded": []}), 500
+
+
+@app.route('/kiosk')
+@admin_required
+def kiosk_page():
+    """Unattended entrance terminal: an admin opens it once, then anyone walking past is checked in."""
+    terminal = request.args.get('terminal', 'default')
+    return render_template('kiosk.html', title='Kiosk', terminal=terminal)
+
+
+@app.route('/kiosk/detect', methods=['POST'])
+@admin_required
+def kiosk_detect():
+    try:
+        images = _request_images()
+        if not images:
+            return jsonify({"message": "No image supplied", "tracks": [], "recorded": []}), 400
+        frame, scale = _decode_frame_scaled(images[0])
+        if frame is None:
+            print("[ERROR] Failed to decode image")
+            return jsonify({"message": "Failed to decode image", "tracks": [], "recorded": []}), 500
+
+        result = kiosk.get_kiosk(request.args.get('terminal', 'default')).process(frame)
+        if result.get("error"):
+            return jsonify({"message": result["error"], "tracks": [], "recorded": []}), 503
+        result["tracks"] = _scale_boxes(result["tracks"], scale)
+        return jsonify(result)
+    except Exception as e:
+        print(f"[ERROR] kiosk_detect: {e}")
+        return jsonify({"message": str(e), "tracks": [], "recorded": []}), 500
+
+
+if sock is not None:
+    @sock.route('/ws/recognize')
+    def recognize_socket(ws):
+        """Streaming recognition: the client sends binary JPEG frames, the server answers with JSON results.
+
+        Frames that arrive while the previous one is still being processed
+        replace it, so a slow server skips frames instead of queuing them.
+        """
+        username = session.get('username')
+        if not username:
+            ws.send(json.dumps({"match": False, "message": "Please login first"}))
+            return
+
+        stream = recognizer.RecognitionSession(username, decode=_decode_frame)
+
+        def send_results():
+            while True:
+                result = stream.results.get()
+                if result is None:
+                    ws.close()
+                    return
+                response = _detect_response(result, username)
+                response["pace"] = recognizer.pacing_hints(username)
+                response.update(stream.stats())
+                ws.send(json.dumps(response))
+
+        sender = threading.Thread(target=send_results, daemon=True)
+        sender.start()
+        try:
+            while True:
+                data = ws.receive()
+                if isinstance(data, (bytes, bytearray)) and data:
+                    stream.submit(data)
+                elif data == 'close':
+                    break
+        finally:
+            stream.close()
+            sender.join(timeout=5)
+            print(f"[WS] Session for {username} ended: {stream.stats()}")
+
+
 # --- SSE stream for live attendance ---
 @app.route('/stream/attendance')
 def stream_attendance():
-    # Server-Sent Events that emits the latest N lines whenever file changes
+    # Server-Sent Events that emits the latest N rows whenever today's count changes
     def gen():
-        path = os.path.join(ATT_DIR, today_filename())
-        last_size = 0
+        store = attendance_store.get_store()
+        last_count = 0
         while True:
             try:
-                if os.path.isfile(path):
-                    size = os.path.getsize(path)
-                    if size != last_size:
-                        last_size = size
-                        rows = read_csv_rows(path)
-                        payload = {"rows": rows[-20:]}  # last 20
-                        yield f"data: {payload}\n\n"
+                date_str = datetime.now(_get_app_timezone()).strftime('%d-%m-%Y')
+                count = store.count(date_str)
+                if count != last_count:
+                    last_count = count
+                    payload = {"rows": store.day(date_str, limit=20)}  # last 20
+                    yield f"data: {payload}\n\n"
             except Exception as e:
                 yield f"data: {{'error': '{str(e)}'}}\n\n"
             time.sleep(1)
@@ -675,6 +892,16 @@ def reset_camera_state(username):
     return redirect(url_for('admin_dashboard'))
 
 
+
+@app.route('/admin/recognizer-stats')
+@admin_required
+def recognizer_stats():
+    """Near-duplicate frame skipping counters (for tuning DUPLICATE_FRAME_MAD) and attendance writer batching."""
+    stats = recognizer.frame_skip_stats()
+    stats['attendance_writer'] = recognizer._attendance_writer.stats()
+    return jsonify(stats)
+
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8000))
     app.run(host='0.0.0.0', port=port, threaded=True)
\ No newline at end of file
@@ -0,0 +1,187 @@
+"""SQLite attendance repository, kept alongside the daily Attendance_DD-MM-YYYY.csv files.
+
+One row per check-in with its ISO date and a sortable local timestamp
+('YYYY-MM-DD HH:MM:SS'). The database runs in WAL mode so page reads
+never wait on the attendance writer. It is indexed on (date, name) for
+per-day listings and on (name, ts) for per-user lookups. The (name, ts)
+index is unique, which makes re-importing the CSV files harmless.
+"""
+import os
+import csv
+import sqlite3
+import threading
+from datetime import datetime, date as date_type
+
+BASE_DIR = os.path.dirname(__file__)
+DEFAULT_DB_PATH = os.environ.get('ATTENDANCE_DB', os.path.join(BASE_DIR, 'data', 'attendance.db'))
+DEFAULT_CSV_DIR = os.path.join(BASE_DIR, 'Attendance')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    date TEXT NOT NULL,
+    ts TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_date_name ON attendance(date, name);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_name_ts ON attendance(name, ts);
+"""
+
+
+def _iso_day(day):
+    """'YYYY-MM-DD' for a date/datetime, an ISO string or the app's 'DD-MM-YYYY'."""
+    if isinstance(day, (datetime, date_type)):
+        return day.strftime('%Y-%m-%d')
+    try:
+        return datetime.strptime(day, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        return datetime.strptime(day, '%d-%m-%Y').strftime('%Y-%m-%d')
+
+
+class AttendanceStore:
+    """Check-in rows in SQLite; one connection per thread."""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _insert(conn, rows):
+        values = [(name, when.strftime('%Y-%m-%d'), when.strftime('%Y-%m-%d %H:%M:%S')) for name, when in rows]
+        before = conn.total_changes
+        conn.executemany('INSERT OR IGNORE INTO attendance (name, date, ts) VALUES (?, ?, ?)', values)
+        return conn.total_changes - before
+
+    def insert_many(self, rows):
+        """Insert (name, datetime) check-ins in one transaction; returns the number added."""
+        conn = self._connect()
+        with conn:
+            return self._insert(conn, rows)
+
+    def day(self, day, name=None, limit=None):
+        """[name, 'HH:MM:SS'] rows for one day in check-in order, optionally for one user or the last ``limit``."""
+        sql = 'SELECT id, name, ts FROM attendance WHERE date = ?'
+        args = [_iso_day(day)]
+        if name is not None:
+            sql += ' AND name = ?'
+            args.append(name)
+        if limit:
+            sql = f'SELECT * FROM ({sql} ORDER BY ts DESC, id DESC LIMIT ?)'
+            args.append(int(limit))
+        sql = f'SELECT name, substr(ts, 12) FROM ({sql}) ORDER BY ts, id'
+        return [list(row) for row in self._connect().execute(sql, args)]
+
+    def count(self, day):
+        """Check-ins recorded on ``day``."""
+        return self._connect().execute('SELECT COUNT(*) FROM attendance WHERE date = ?', (_iso_day(day),)).fetchone()[0]
+
+    def dates(self):
+        """Days with at least one check-in, newest first, as datetime.date."""
+        rows = self._connect().execute('SELECT DISTINCT date FROM attendance ORDER BY date DESC')
+        return [datetime.strptime(d, '%Y-%m-%d').date() for (d,) in rows]
+
+    def user_history(self, name, start=None, end=None, limit=50, offset=0):
+        """One user's check-ins from ``start`` to ``end`` (inclusive days), newest first.
+
+        Returns ``(rows, total)`` where rows are ['DD-MM-YYYY', 'HH:MM:SS'];
+        both the page and the count are range scans of the (name, ts) index.
+        """
+        where = 'name = ?'
+        args = [name]
+        if start is not None:
+            where += ' AND ts >= ?'
+            args.append(_iso_day(start) + ' 00:00:00')
+        if end is not None:
+            where += ' AND ts <= ?'
+            args.append(_iso_day(end) + ' 23:59:59')
+        conn = self._connect()
+        total = conn.execute(f'SELECT COUNT(*) FROM attendance WHERE {where}', args).fetchone()[0]
+        cursor = conn.execute(f'SELECT ts FROM attendance WHERE {where} ORDER BY ts DESC LIMIT ? OFFSET ?',
+                              args + [int(limit), int(offset)])
+        rows = [[f'{ts[8:10]}-{ts[5:7]}-{ts[:4]}', ts[11:]] for (ts,) in cursor]
+        return rows, total
+
+    def is_empty(self):
+        return self._connect().execute('SELECT 1 FROM attendance LIMIT 1').fetchone() is None
+
+    def import_csv_dir(self, directory=DEFAULT_CSV_DIR):
+        """Load every Attendance_DD-MM-YYYY.csv in ``directory``; returns (files, rows added)."""
+        files = added = 0
+        for rows in _read_csv_dir(directory):
+            added += self.insert_many(rows)
+            files += 1
+        return files, added
+
+    def rebuild(self, directory=DEFAULT_CSV_DIR):
+        """Replace every row with the contents of the CSV files, in one transaction.
+
+        Readers keep seeing the old rows until the rebuild commits.
+        """
+        files = added = 0
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM attendance')
+            for rows in _read_csv_dir(directory):
+                added += self._insert(conn, rows)
+                files += 1
+        return files, added
+
+    def export_csv(self, day, f):
+        """Write ``day`` to the file object ``f`` in the Attendance_DD-MM-YYYY.csv layout."""
+        writer = csv.writer(f)
+        writer.writerow(['NAME', 'TIME'])
+        writer.writerows(self.day(day))
+
+
+def _read_csv_dir(directory):
+    """Yield the (name, datetime) rows of each Attendance_DD-MM-YYYY.csv in ``directory``."""
+    if not os.path.isdir(directory):
+        return
+    for fname in sorted(os.listdir(directory)):
+        if not (fname.startswith('Attendance_') and fname.lower().endswith('.csv')):
+            continue
+        try:
+            day = datetime.strptime(fname[len('Attendance_'):-len('.csv')], '%d-%m-%Y')
+        except ValueError:
+            print(f"[STORE] Skipping {fname}: no DD-MM-YYYY date in the name")
+            continue
+        rows = []
+        with open(os.path.join(directory, fname), newline='', encoding='utf-8') as f:
+            for row in csv.reader(f):
+                if len(row) < 2 or row[0].lower() == 'name':
+                    continue
+                try:
+                    t = datetime.strptime(row[1].strip(), '%H:%M:%S').time()
+                except ValueError:
+                    continue
+                rows.append((row[0], datetime.combine(day.date(), t)))
+        yield rows
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """The shared store at ATTENDANCE_DB, seeded from Attendance/ the first time it is opened empty."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            store = AttendanceStore(DEFAULT_DB_PATH)
+            if store.is_empty() and os.path.isdir(DEFAULT_CSV_DIR):
+                files, added = store.import_csv_dir(DEFAULT_CSV_DIR)
+                print(f"[STORE] Imported {added} check-ins from {files} attendance files")
+            _store = store
+        return _store
@@ -0,0 +1,163 @@
+"""Background writer for the daily Attendance_DD-MM-YYYY.csv files.
+
+Check-ins are queued by the request thread and written by one daemon
+thread that keeps the current day's file open. Rows that arrive together
+are written as one batch, followed by a flush or fsync according to
+ATTENDANCE_SYNC, and the same batch is inserted into the attendance
+store in one transaction. ``close()`` (registered with atexit) drains the
+queue before the process exits.
+"""
+import os
+import io
+import csv
+import time
+import queue
+import atexit
+import threading
+
+# After a batch: 'flush' hands rows to the OS (readers see them at once), 'fsync' also
+# forces them to disk, 'none' leaves them buffered until the file is rolled over or closed
+ATTENDANCE_SYNC = os.environ.get('ATTENDANCE_SYNC', 'flush').lower()
+# How long (ms) the writer waits after the first queued row for more to join its batch
+ATTENDANCE_BATCH_MS = float(os.environ.get('ATTENDANCE_BATCH_MS', 20))
+# Rows written per batch at most
+ATTENDANCE_BATCH_MAX = int(os.environ.get('ATTENDANCE_BATCH_MAX', 256))
+
+_STOP = object()
+
+
+def csv_name(when):
+    """File name for the day of ``when`` (an aware datetime)."""
+    return f"Attendance_{when.strftime('%d-%m-%Y')}.csv"
+
+
+class AttendanceWriter:
+    """Queue of (name, datetime) check-ins appended to per-day CSV files by a background thread."""
+
+    def __init__(self, directory, store=None, sync=None, batch_ms=None, batch_max=None):
+        """``store`` is an AttendanceStore, or a callable returning one on the first batch."""
+        self.directory = directory
+        self._store = store
+        self.sync = sync or ATTENDANCE_SYNC
+        self.batch_wait = (ATTENDANCE_BATCH_MS if batch_ms is None else batch_ms) / 1000.0
+        self.batch_max = batch_max or ATTENDANCE_BATCH_MAX
+        self._queue = queue.Queue()
+        self._file = None
+        self._path = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = None
+        self.rows = 0
+        self.batches = 0
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='attendance-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def write(self, name, when):
+        """Queue one check-in; returns immediately."""
+        if self._closed:
+            raise RuntimeError('Attendance writer is closed')
+        if self._thread is None:
+            self._start()
+        self._queue.put((name, when))
+
+    def flush(self):
+        """Block until every queued row has been written (and flushed per the sync policy)."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        """Drain the queue, stop the thread and close the open file."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _collect(self, first):
+        """``first`` plus whatever else arrives within the batch window."""
+        batch = [first]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_max and batch[-1] is not _STOP:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch = self._collect(self._queue.get())
+            rows = [item for item in batch if item is not _STOP]
+            stop = len(rows) != len(batch)
+            try:
+                if rows:
+                    self._write_batch(rows)
+            except Exception as e:
+                print(f"[ERROR] Attendance write failed for {', '.join(name for name, _ in rows)}: {e}")
+                self._close_file()
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        self._close_file()
+
+    def _write_batch(self, rows):
+        # Rows are grouped by their own date so a batch spanning midnight lands in both files
+        by_path = {}
+        for name, when in rows:
+            path = os.path.join(self.directory, csv_name(when))
+            by_path.setdefault(path, []).append([name, when.strftime('%H:%M:%S')])
+        for path, lines in by_path.items():
+            f = self._open(path)
+            buf = io.StringIO()
+            csv.writer(buf).writerows(lines)
+            f.write(buf.getvalue())
+            if self.sync in ('flush', 'fsync'):
+                f.flush()
+                if self.sync == 'fsync':
+                    os.fsync(f.fileno())
+        # After the CSV append, so a store rebuilt from the files never misses a stored row
+        self._write_store(rows)
+        self.rows += len(rows)
+        self.batches += 1
+
+    def _write_store(self, rows):
+        if self._store is None:
+            return
+        try:
+            if callable(self._store):
+                self._store = self._store()
+            self._store.insert_many(rows)
+        except Exception as e:
+            # The CSV files still get the rows; `scripts/attendance_db.py import` catches the store up
+            print(f"[ERROR] Attendance store insert failed for {len(rows)} rows: {e}")
+
+    def _open(self, path):
+        if path != self._path:
+            self._close_file()
+            os.makedirs(self.directory, exist_ok=True)
+            f = open(path, 'a', newline='', encoding='utf-8')
+            if f.tell() == 0:
+                csv.writer(f).writerow(['NAME', 'TIME'])
+            self._file, self._path = f, path
+        return self._file
+
+    def _close_file(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception as e:
+                print(f"[ERROR] Closing {self._path}: {e}")
+            self._file, self._path = None, None
+
+    def stats(self):
+        return {"rows": self.rows, "batches": self.batches, "queued": self._queue.qsize(), "sync": self.sync}
+
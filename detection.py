@@ -0,0 +1,190 @@
+"""Face detection profiles for the Haar cascade.
+
+A profile downsamples the grayscale frame to a detection width before
+running ``detectMultiScale`` and bounds the face sizes the cascade
+searches for (as fractions of the frame's shorter side), so scales that
+cannot hold a face at kiosk distance are never evaluated. Boxes are mapped
+back to full-resolution coordinates, so callers keep cropping from the
+original frame.
+
+    full      legacy behaviour: native resolution, no size bounds
+    balanced  320 px wide, faces 12%-90% of the frame height (default)
+    fast      240 px wide, faces 20%-80% of the frame height
+
+Select one with the DETECTION_PROFILE environment variable.
+
+``DetectorPool`` hands out CascadeClassifier instances to request threads,
+since a single classifier must not be used by two threads at once.
+"""
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+# Upper bound on cascade instances per process (one per concurrently detecting thread)
+DETECTOR_POOL_SIZE = int(os.environ.get('DETECTOR_POOL_SIZE', max(os.cpu_count() or 1, 4)))
+
+
+class DetectionProfile:
+    def __init__(self, name, width=None, min_face=0.0, max_face=1.0):
+        self.name = name
+        self.width = width          # detection width in px (None = native resolution)
+        self.min_face = min_face    # smallest face, fraction of the frame's shorter side
+        self.max_face = max_face    # largest face, fraction of the frame's shorter side (1.0 = unbounded)
+
+    def scale_for(self, shape):
+        """Factor that brings a frame of ``shape`` down to the profile width (never upsamples)."""
+        if not self.width or shape[1] <= self.width:
+            return 1.0
+        return self.width / float(shape[1])
+
+    def detect(self, cascade, gray, scale_factor=1.1, min_neighbors=5, min_size=(0, 0), frame_shape=None):
+        """Run ``cascade`` on ``gray`` at the profile resolution; boxes come back in ``gray``'s coordinates.
+
+        ``min_size`` is in full-resolution pixels. Pass ``frame_shape`` when
+        ``gray`` is a window cut from a larger frame, so the window is scaled
+        and bounded the same way as the whole frame would be.
+        """
+        frame_shape = frame_shape or gray.shape
+        scale = self.scale_for(frame_shape)
+        small = gray
+        if scale != 1.0:
+            size = (max(int(round(gray.shape[1] * scale)), 1), max(int(round(gray.shape[0] * scale)), 1))
+            small = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+        side = min(frame_shape[:2]) * scale
+        lo = max(int(side * self.min_face), int(min_size[0] * scale), int(min_size[1] * scale))
+        hi = int(side * self.max_face) if self.max_face < 1.0 else 0
+        if hi and hi < lo:
+            hi = lo
+
+        faces = cascade.detectMultiScale(small, scaleFactor=scale_factor, minNeighbors=min_neighbors,
+                                         minSize=(lo, lo), maxSize=(hi, hi))
+        if len(faces) == 0:
+            return np.empty((0, 4), dtype=int)
+        return np.round(np.asarray(faces) / scale).astype(int)
+
+
+PROFILES = {
+    'full': DetectionProfile('full'),
+    'balanced': DetectionProfile('balanced', width=320, min_face=0.12, max_face=0.9),
+    'fast': DetectionProfile('fast', width=240, min_face=0.2, max_face=0.8),
+}
+
+
+def get_profile(name=None):
+    name = (name or os.environ.get('DETECTION_PROFILE', 'balanced')).lower()
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown detection profile '{name}'. Choose from: {', '.join(PROFILES)}")
+
+
+_REDUCED_DECODE = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def jpeg_size(buf):
+    """(width, height) from a JPEG's start-of-frame marker, or None if ``buf`` is not a JPEG."""
+    view = memoryview(buf)
+    if len(view) < 4 or view[0] != 0xFF or view[1] != 0xD8:
+        return None
+    pos = 2
+    while pos + 9 < len(view):
+        if view[pos] != 0xFF:
+            return None
+        marker = view[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            return (view[pos + 7] << 8) | view[pos + 8], (view[pos + 5] << 8) | view[pos + 6]
+        pos += 2 + ((view[pos + 2] << 8) | view[pos + 3])
+    return None
+
+
+def decode_frame(buf, profile=None):
+    """Decode encoded image bytes into a BGR frame without copying the input (None on failure).
+
+    When ``profile`` has a detection width, JPEGs are decoded at 1/2, 1/4 or
+    1/8 size (libjpeg scales during the IDCT) as long as the result is still
+    at least that wide.
+    """
+    return decode_frame_scaled(buf, profile)[0]
+
+
+def decode_frame_scaled(buf, profile=None):
+    """``decode_frame`` plus the factor (1, 2, 4 or 8) it was reduced by.
+
+    Multiply boxes found in the frame by the factor to get coordinates in
+    the uploaded image.
+    """
+    flag, scale = cv2.IMREAD_COLOR, 1
+    if profile is not None and profile.width:
+        size = jpeg_size(buf)
+        if size:
+            for factor, reduced in _REDUCED_DECODE:
+                if size[0] // factor >= profile.width:
+                    flag, scale = reduced, factor
+                    break
+    return cv2.imdecode(np.frombuffer(buf, dtype=np.uint8), flag), scale
+
+
+class DetectorPool:
+    """Bounded pool of CascadeClassifier instances parsed from one in-memory copy of the cascade XML.
+
+    Instances are created on demand up to ``size``; when all are checked
+    out, further threads wait for one to come back.
+    """
+
+    def __init__(self, xml, size=None):
+        self._xml = xml
+        self.size = size or DETECTOR_POOL_SIZE
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._idle.put(self._new())  # fail early on a bad cascade
+        self._created = 1
+
+    @classmethod
+    def from_file(cls, path, size=None):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(f.read(), size)
+
+    def __len__(self):
+        return self._created
+
+    def _new(self):
+        fs = cv2.FileStorage(self._xml, cv2.FILE_STORAGE_READ | cv2.FILE_STORAGE_MEMORY)
+        try:
+            cascade = cv2.CascadeClassifier()
+            if not cascade.read(fs.getFirstTopLevelNode()) or cascade.empty():
+                raise ValueError('Cascade XML could not be parsed')
+        finally:
+            fs.release()
+        return cascade
+
+    @contextmanager
+    def checkout(self):
+        """Borrow a classifier for the duration of the ``with`` block."""
+        try:
+            cascade = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._created < self.size
+                if grow:
+                    self._created += 1  # reserve the slot; parse outside the lock
+            if grow:
+                try:
+                    cascade = self._new()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                cascade = self._idle.get()
+        try:
+            yield cascade
+        finally:
+            self._idle.put(cascade)
@@ -0,0 +1,303 @@
+"""Nearest-neighbour index backends for the face matcher.
+
+Every backend stores float32 vectors under consecutive integer ids and
+offers the same operations:
+
+    build(vectors)          replace the contents
+    add(vectors) -> ids     append, returns the new ids
+    remove(ids)             tombstone ids so they are never returned
+    query(Q, k, limit=None) -> (squared distances, ids), closest first;
+                            ids >= limit are ignored (older snapshots)
+
+``exact`` is a brute-force scan, ``lsh`` hashes with random hyperplanes and
+``hnsw`` walks a hierarchical navigable small-world graph. The approximate
+backends trade recall for speed on large galleries; ``evaluate`` reports
+recall@k and latency against the exact answer.
+"""
+import heapq
+import math
+import time
+
+import numpy as np
+
+
+class BruteForceIndex:
+    """Exact scan: one matmul per query batch."""
+
+    kind = 'exact'
+
+    def __init__(self):
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._alive = np.empty(0, dtype=bool)
+        self._n = 0
+
+    def __len__(self):
+        return self._n
+
+    def _grow(self, extra, dim):
+        capacity = self._vectors.shape[0]
+        if self._n + extra <= capacity:
+            return
+        capacity = max(2 * (self._n + extra), 64)
+        vectors = np.empty((capacity, dim), dtype=np.float32)
+        norms = np.empty(capacity, dtype=np.float32)
+        alive = np.zeros(capacity, dtype=bool)
+        vectors[:self._n] = self._vectors[:self._n]
+        norms[:self._n] = self._norms[:self._n]
+        alive[:self._n] = self._alive[:self._n]
+        self._vectors, self._norms, self._alive = vectors, norms, alive
+
+    def build(self, vectors):
+        self._n = 0
+        self._vectors = np.empty((0, vectors.shape[1]), dtype=np.float32)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._alive = np.empty(0, dtype=bool)
+        self.add(vectors)
+        return self
+
+    def add(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self._grow(len(vectors), vectors.shape[1])
+        start, stop = self._n, self._n + len(vectors)
+        self._vectors[start:stop] = vectors
+        self._norms[start:stop] = np.einsum('ij,ij->i', vectors, vectors)
+        self._alive[start:stop] = True
+        self._n = stop
+        return np.arange(start, stop)
+
+    def remove(self, ids):
+        self._alive[np.asarray(ids, dtype=np.intp)] = False
+
+    def _distances(self, q, ids):
+        diff = self._vectors[ids] - q
+        return np.einsum('ij,ij->i', diff, diff)
+
+    def query(self, Q, k, limit=None):
+        Q = np.atleast_2d(np.asarray(Q, dtype=np.float32))
+        n = self._n if limit is None else min(limit, self._n)
+        d2 = Q @ self._vectors[:n].T
+        d2 *= -2.0
+        d2 += self._norms[:n]
+        d2 += np.einsum('ij,ij->i', Q, Q)[:, None]
+        d2[:, ~self._alive[:n]] = np.inf
+        return _top_k(d2, k)
+
+
+class LSHIndex(BruteForceIndex):
+    """Random-hyperplane LSH with multi-probe lookups and exact re-ranking of the candidates.
+
+    Vectors should be roughly centred (PCA embeddings or mean-subtracted
+    pixels), since every hyperplane passes through the origin.
+    """
+
+    kind = 'lsh'
+
+    def __init__(self, n_tables=8, n_bits=12, multiprobe=True, seed=0):
+        super().__init__()
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.multiprobe = multiprobe
+        self.seed = seed
+        self._planes = None
+        self._tables = []
+        self._weights = 1 << np.arange(n_bits, dtype=np.int64)
+
+    def _hash(self, vectors):
+        """Bucket key of every vector in every table, shape (n_tables, n)."""
+        bits = np.einsum('tbd,nd->tnb', self._planes, vectors) > 0
+        return bits.astype(np.int64) @ self._weights
+
+    def build(self, vectors):
+        rng = np.random.default_rng(self.seed)
+        self._planes = rng.standard_normal((self.n_tables, self.n_bits, vectors.shape[1])).astype(np.float32)
+        self._tables = [{} for _ in range(self.n_tables)]
+        return super().build(vectors)
+
+    def add(self, vectors):
+        ids = super().add(vectors)
+        keys = self._hash(np.asarray(vectors, dtype=np.float32))
+        for table, table_keys in zip(self._tables, keys):
+            for key, i in zip(table_keys.tolist(), ids.tolist()):
+                table.setdefault(key, []).append(i)
+        return ids
+
+    def _candidates(self, keys):
+        found = set()
+        for table, key in zip(self._tables, keys):
+            found.update(table.get(key, ()))
+            if self.multiprobe:
+                for b in range(self.n_bits):
+                    found.update(table.get(key ^ (1 << b), ()))
+        return found
+
+    def query(self, Q, k, limit=None):
+        Q = np.atleast_2d(np.asarray(Q, dtype=np.float32))
+        n = self._n if limit is None else min(limit, self._n)
+        keys = self._hash(Q)
+        out_d2 = np.full((len(Q), k), np.inf, dtype=np.float32)
+        out_ids = np.full((len(Q), k), -1, dtype=np.intp)
+        for row, q in enumerate(Q):
+            ids = np.fromiter(self._candidates(keys[:, row].tolist()), dtype=np.intp)
+            ids = ids[ids < n]
+            ids = ids[self._alive[ids]]
+            if len(ids) < k:
+                # Too few hits in the buckets; answer this probe exactly
+                d2, found = BruteForceIndex.query(self, q, k, limit)
+                out_d2[row], out_ids[row] = d2[0], found[0]
+                continue
+            d2, order = _top_k(self._distances(q, ids)[None, :], k)
+            out_d2[row], out_ids[row] = d2[0], ids[order[0]]
+        return out_d2, out_ids
+
+
+class HNSWIndex(BruteForceIndex):
+    """Hierarchical navigable small-world graph (Malkov & Yashunin) in pure Python/NumPy.
+
+    Removed ids stay in the graph as waypoints but are never returned.
+    """
+
+    kind = 'hnsw'
+
+    def __init__(self, M=16, ef_construction=100, ef_search=64, seed=0):
+        super().__init__()
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._level_mult = 1.0 / math.log(M)
+        self._rng = np.random.default_rng(seed)
+        self._links = []  # one {node: [neighbours]} dict per level
+        self._entry = None
+        self._max_level = -1
+
+    def build(self, vectors):
+        self._links = []
+        self._entry = None
+        self._max_level = -1
+        return super().build(vectors)
+
+    def add(self, vectors):
+        ids = super().add(vectors)
+        for i in ids.tolist():
+            self._insert(i)
+        return ids
+
+    def _search_layer(self, q, entry_points, ef, level, limit):
+        """Best-first search on one level; returns up to ``ef`` (d2, id) pairs, closest first."""
+        links = self._links[level]
+        visited = set(entry_points)
+        d2 = self._distances(q, list(entry_points))
+        candidates = [(d, i) for d, i in zip(d2.tolist(), entry_points)]
+        heapq.heapify(candidates)
+        best = [(-d, i) for d, i in candidates]
+        heapq.heapify(best)
+        while len(best) > ef:
+            heapq.heappop(best)
+
+        while candidates:
+            d, i = heapq.heappop(candidates)
+            if d > -best[0][0] and len(best) >= ef:
+                break
+            fresh = [j for j in links.get(i, ()) if j not in visited and j < limit]
+            if not fresh:
+                continue
+            visited.update(fresh)
+            for dj, j in zip(self._distances(q, fresh).tolist(), fresh):
+                if len(best) < ef or dj < -best[0][0]:
+                    heapq.heappush(candidates, (dj, j))
+                    heapq.heappush(best, (-dj, j))
+                    if len(best) > ef:
+                        heapq.heappop(best)
+        return sorted((-d, i) for d, i in best)
+
+    def _connect(self, node, neighbours, level):
+        links = self._links[level]
+        links[node] = neighbours
+        max_links = 2 * self.M if level == 0 else self.M
+        for j in neighbours:
+            peers = links.setdefault(j, [])
+            peers.append(node)
+            if len(peers) > max_links:
+                d2 = self._distances(self._vectors[j], peers)
+                links[j] = [peers[p] for p in np.argsort(d2)[:max_links]]
+
+    def _insert(self, node):
+        level = int(-math.log(1.0 - self._rng.random()) * self._level_mult)
+        while len(self._links) <= level:
+            self._links.append({})
+        if self._entry is None:
+            for lv in range(level + 1):
+                self._links[lv][node] = []
+            self._entry, self._max_level = node, level
+            return
+
+        q = self._vectors[node]
+        limit = self._n
+        entry = [self._entry]
+        for lv in range(self._max_level, level, -1):
+            entry = [self._search_layer(q, entry, 1, lv, limit)[0][1]]
+        for lv in range(min(level, self._max_level), -1, -1):
+            found = self._search_layer(q, entry, self.ef_construction, lv, limit)
+            self._connect(node, [i for _, i in found[:self.M]], lv)
+            entry = [i for _, i in found]
+        for lv in range(self._max_level + 1, level + 1):
+            self._links[lv][node] = []
+        if level > self._max_level:
+            self._entry, self._max_level = node, level
+
+    def query(self, Q, k, limit=None):
+        Q = np.atleast_2d(np.asarray(Q, dtype=np.float32))
+        limit = self._n if limit is None else min(limit, self._n)
+        out_d2 = np.full((len(Q), k), np.inf, dtype=np.float32)
+        out_ids = np.full((len(Q), k), -1, dtype=np.intp)
+        if self._entry is None or self._entry >= limit:
+            # Graph entry belongs to a newer snapshot; scan the older rows instead
+            return BruteForceIndex.query(self, Q, k, limit)
+        for row, q in enumerate(Q):
+            entry = [self._entry]
+            for lv in range(self._max_level, 0, -1):
+                entry = [self._search_layer(q, entry, 1, lv, limit)[0][1]]
+            found = self._search_layer(q, entry, max(self.ef_search, k), 0, limit)
+            found = [(d, i) for d, i in found if self._alive[i]][:k]
+            for col, (d, i) in enumerate(found):
+                out_d2[row, col], out_ids[row, col] = d, i
+        return out_d2, out_ids
+
+
+BACKENDS = {
+    'exact': BruteForceIndex,
+    'lsh': LSHIndex,
+    'hnsw': HNSWIndex,
+}
+
+
+def make_index(kind='exact', **params):
+    try:
+        return BACKENDS[kind](**params)
+    except KeyError:
+        raise ValueError(f"Unknown index backend '{kind}'. Choose from: {', '.join(BACKENDS)}")
+
+
+def _top_k(d2, k):
+    k = min(k, d2.shape[1])
+    if k < d2.shape[1]:
+        idx = np.argpartition(d2, k - 1, axis=1)[:, :k]
+    else:
+        idx = np.broadcast_to(np.arange(d2.shape[1]), d2.shape)
+    part = np.take_along_axis(d2, idx, axis=1)
+    order = np.argsort(part, axis=1)
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(idx, order, axis=1)
+
+
+def evaluate(index, queries, k=3, truth=None):
+    """Return ``{'recall': recall@k, 'ms_per_query': latency}`` of ``index`` against an exact scan."""
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    if truth is None:
+        exact = BruteForceIndex().build(index._vectors[:len(index)])
+        exact._alive[:len(index)] = index._alive[:len(index)]
+        truth = exact.query(queries, k)[1]
+    start = time.perf_counter()
+    found = np.vstack([index.query(q, k)[1] for q in queries])
+    ms = (time.perf_counter() - start) / len(queries) * 1000.0
+    hits = sum(len(set(f.tolist()) & set(t.tolist())) for f, t in zip(found, truth))
+    return {'recall': hits / float(truth.size), 'ms_per_query': ms}
@@ -0,0 +1,408 @@
+"""On-disk face gallery shared by the recognizer and registration.
+
+Layout of ``data/gallery/``::
+
+    header.json   {"version": 1, "dtype": "uint8", "dim": 7500, "count": N,
+                   "generation": G, "id": "<hex>"}
+    samples.u8    N x dim raw sample rows, opened read-only with np.memmap
+    labels.json   one label per sample row
+
+``header.json`` is the commit point: it is always replaced last and
+atomically, so readers only ever see ``count`` fully written rows even while
+an enrollment is appending. Because the sample matrix is memory-mapped,
+several worker processes share one page-cache copy of it.
+
+When ``GALLERY_PROTOTYPES`` is set, each identity is also condensed to that
+many prototype rows stored as a second gallery in ``data/gallery/prototypes/``;
+the recognizer then matches against the prototypes and the raw samples stay
+on disk as cold storage for re-condensing.
+
+``generation`` is bumped on every change so other processes can notice new
+enrollments by re-reading the tiny header; ``id`` changes only when the
+gallery is rewritten, which tells readers whether they can just load the
+rows past the count they already have.
+"""
+import json
+import os
+import pickle
+import threading
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within one process
+    fcntl = None
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+GALLERY_DIR = os.path.join(DATA_DIR, 'gallery')
+PROTOTYPES_DIR = os.path.join(GALLERY_DIR, 'prototypes')
+# Prototypes kept per identity; 0 matches against every raw sample
+PROTOTYPES_PER_IDENTITY = int(os.environ.get('GALLERY_PROTOTYPES', 0))
+FORMAT_VERSION = 1
+SAMPLE_DIM = 50 * 50 * 3
+SAMPLE_DTYPE = 'uint8'
+
+_HEADER = 'header.json'
+_SAMPLES = 'samples.u8'
+_LABELS = 'labels.json'
+
+_write_lock = threading.Lock()
+_LOCK_FILE = '.write.lock'
+
+
+def _path(root, name):
+    return os.path.join(root, name)
+
+
+@contextmanager
+def _writing(root):
+    """Serialize gallery writers across threads and, through flock on a lock file, across worker processes."""
+    with _write_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(root, exist_ok=True)
+        with open(_path(root, _LOCK_FILE), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _write_json_atomic(path, payload):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(payload, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _new_header(count, dim=SAMPLE_DIM, previous=None):
+    """Build the next header; keeps ``id`` from ``previous`` (an append) or starts a new one (a rewrite)."""
+    return {
+        'version': FORMAT_VERSION,
+        'dtype': SAMPLE_DTYPE,
+        'dim': int(dim),
+        'count': int(count),
+        'generation': (previous.get('generation', 0) + 1) if previous else 1,
+        'id': previous.get('id') if previous and previous.get('id') else uuid.uuid4().hex,
+    }
+
+
+def exists(root=GALLERY_DIR):
+    return os.path.isfile(_path(root, _HEADER))
+
+
+def read_header(root=GALLERY_DIR):
+    header = _read_json(_path(root, _HEADER))
+    if header.get('version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported gallery version {header.get('version')} in {root}")
+    if header.get('dtype') != SAMPLE_DTYPE:
+        raise ValueError(f"Unsupported gallery dtype {header.get('dtype')} in {root}")
+    return header
+
+
+def load_labels(root=GALLERY_DIR):
+    """Return the committed labels without touching the sample matrix."""
+    header = read_header(root)
+    return [str(x) for x in _read_json(_path(root, _LABELS))[:header['count']]]
+
+
+def read_generation(root=GALLERY_DIR):
+    """Return ``(generation, id)`` from the header, or ``(None, None)`` if there is no gallery."""
+    try:
+        header = _read_json(_path(root, _HEADER))
+    except (OSError, ValueError):
+        return None, None
+    return header.get('generation', 0), header.get('id')
+
+
+def load(root=GALLERY_DIR, repair=True):
+    """Return ``(faces, labels)`` with ``faces`` a read-only memmap of shape (count, dim).
+
+    If the label sidecar or the sample file is shorter than the header says
+    (an interrupted write), the gallery is trimmed to the rows that are
+    complete and, when ``repair`` is set, the fix is persisted.
+    """
+    _, faces, labels = load_snapshot(root, repair)
+    return faces, labels
+
+
+def load_snapshot(root=GALLERY_DIR, repair=True):
+    """Like ``load`` but also returns the header the rows were read against."""
+    header, labels, n_rows = _read_state(root)
+    dim, count = header['dim'], header['count']
+
+    m = min(count, len(labels), n_rows)
+    if m != count:
+        print(f"⚠️  Mismatch: header says {count} samples, found {n_rows} rows and {len(labels)} labels. Trimming to {m} entries.")
+        if repair:
+            try:
+                with _writing(root):
+                    # Another writer may have finished or replaced the gallery since the read above
+                    header, labels, n_rows = _read_state(root)
+                    dim, count = header['dim'], header['count']
+                    m = min(count, len(labels), n_rows)
+                    if m != count:
+                        _truncate_samples(root, m, dim)
+                        _write_json_atomic(_path(root, _LABELS), labels[:m])
+                        header = _new_header(m, dim, previous=header)
+                        _write_json_atomic(_path(root, _HEADER), header)
+                        print("✅ Trimmed and saved corrected gallery")
+            except Exception as e:
+                print(f"⚠️  Failed to persist trimmed gallery: {e}")
+        count = m
+
+    labels = labels[:count]
+    if count == 0:
+        return header, np.empty((0, dim), dtype=SAMPLE_DTYPE), labels
+    faces = np.memmap(_path(root, _SAMPLES), dtype=SAMPLE_DTYPE, mode='r', shape=(count, dim))
+    return header, faces, labels
+
+
+def _read_state(root):
+    """``(header, labels, sample rows on disk)`` as currently stored at ``root``."""
+    header = read_header(root)
+    labels = [str(x) for x in _read_json(_path(root, _LABELS))]
+    samples_path = _path(root, _SAMPLES)
+    n_rows = os.path.getsize(samples_path) // header['dim'] if os.path.isfile(samples_path) else 0
+    return header, labels, n_rows
+
+
+def _truncate_samples(root, count, dim):
+    with open(_path(root, _SAMPLES), 'ab') as f:
+        f.truncate(count * dim)
+
+
+def _as_rows(faces, dim=SAMPLE_DIM):
+    faces = np.asarray(faces)
+    if faces.ndim != 2:
+        faces = faces.reshape(faces.shape[0], -1)
+    if faces.shape[1] != dim:
+        raise ValueError(f'Expected {dim}-d samples, got {faces.shape[1]}')
+    return np.ascontiguousarray(faces, dtype=SAMPLE_DTYPE)
+
+
+def write(faces, labels, root=GALLERY_DIR):
+    """Replace the gallery at ``root`` with ``faces``/``labels``. Returns the new header."""
+    faces = _as_rows(faces)
+    labels = [str(x) for x in labels]
+    if faces.shape[0] != len(labels):
+        raise ValueError(f'{faces.shape[0]} face samples vs {len(labels)} labels')
+
+    os.makedirs(root, exist_ok=True)
+    with _writing(root):
+        try:
+            previous = _read_json(_path(root, _HEADER))
+        except (OSError, ValueError):
+            previous = None
+        # A rewrite keeps the generation sequence but gets a new id
+        header = _new_header(len(labels), faces.shape[1], previous=previous)
+        header['id'] = uuid.uuid4().hex
+        tmp = _path(root, _SAMPLES + '.tmp')
+        with open(tmp, 'wb') as f:
+            faces.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, _path(root, _SAMPLES))
+        _write_json_atomic(_path(root, _LABELS), labels)
+        _write_json_atomic(_path(root, _HEADER), header)
+    return header
+
+
+def append(faces, labels, root=GALLERY_DIR):
+    """Append samples in place; existing rows and open memmaps are left untouched.
+
+    Returns the new header.
+    """
+    faces = _as_rows(faces)
+    labels = [str(x) for x in labels]
+    if faces.shape[0] != len(labels):
+        raise ValueError(f'{faces.shape[0]} face samples vs {len(labels)} labels')
+    if not exists(root):
+        return write(faces, labels, root)
+
+    with _writing(root):
+        header = read_header(root)
+        dim, count = header['dim'], header['count']
+        if dim != faces.shape[1]:
+            raise ValueError(f'Gallery stores {dim}-d samples, got {faces.shape[1]}')
+        committed = [str(x) for x in _read_json(_path(root, _LABELS))][:count]
+
+        # Drop any rows left behind by an interrupted append before writing
+        _truncate_samples(root, count, dim)
+        with open(_path(root, _SAMPLES), 'ab') as f:
+            faces.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        _write_json_atomic(_path(root, _LABELS), committed + labels)
+        header = _new_header(count + len(labels), dim, previous=header)
+        _write_json_atomic(_path(root, _HEADER), header)
+    return header
+
+
+def migrate_from_pickles(data_dir=DATA_DIR, root=GALLERY_DIR, force=False):
+    """One-shot conversion of ``names.pkl``/``faces_data.pkl`` into the gallery format.
+
+    Returns the number of migrated samples, or 0 if a gallery already exists
+    and ``force`` is not set. The pickles are left in place.
+    """
+    if exists(root) and not force:
+        return 0
+    names_path = os.path.join(data_dir, 'names.pkl')
+    faces_path = os.path.join(data_dir, 'faces_data.pkl')
+    if not (os.path.isfile(names_path) and os.path.isfile(faces_path)):
+        raise FileNotFoundError('names.pkl or faces_data.pkl not found in data/. Add faces first.')
+
+    with open(names_path, 'rb') as f:
+        labels = pickle.load(f)
+    with open(faces_path, 'rb') as f:
+        faces = pickle.load(f)
+
+    try:
+        labels = list(labels)
+    except Exception:
+        labels = [str(x) for x in labels]
+    faces = np.asarray(faces)
+    if faces.ndim != 2:
+        faces = faces.reshape(faces.shape[0], -1)
+
+    # Same trim-on-mismatch repair the pickle loader used to do
+    if len(labels) != faces.shape[0]:
+        m = min(len(labels), faces.shape[0])
+        print(f"⚠️  Mismatch: {faces.shape[0]} face samples vs {len(labels)} labels. Trimming to {m} entries.")
+        labels = labels[:m]
+        faces = faces[:m]
+
+    write(faces, labels, root)
+    print(f"✅ Migrated {len(labels)} samples from pickles to {root}")
+    return len(labels)
+
+
+def ensure_gallery(data_dir=DATA_DIR, root=GALLERY_DIR):
+    """Migrate the legacy pickles on first use. Returns True if a gallery is available."""
+    if exists(root):
+        return True
+    try:
+        migrate_from_pickles(data_dir, root)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def registered_names(data_dir=DATA_DIR, root=GALLERY_DIR):
+    """Return the distinct enrolled names, reading the legacy ``names.pkl`` if no gallery exists yet."""
+    if exists(root):
+        labels = load_labels(root)
+    else:
+        names_path = os.path.join(data_dir, 'names.pkl')
+        if not os.path.isfile(names_path):
+            return []
+        with open(names_path, 'rb') as f:
+            labels = list(pickle.load(f))
+    return list(dict.fromkeys(labels))
+
+
+def condense_identity(faces, n_prototypes, iterations=10, seed=0):
+    """Return the row indices of up to ``n_prototypes`` medoids of one identity's samples.
+
+    Runs k-means (k-means++ seeding) and keeps the real sample closest to
+    each centre, so prototypes stay valid uint8 face crops.
+    """
+    X = np.asarray(faces, dtype=np.float32).reshape(len(faces), -1)
+    n = X.shape[0]
+    if n <= n_prototypes:
+        return np.arange(n)
+    rng = np.random.default_rng(seed)
+    sq = np.einsum('ij,ij->i', X, X)
+
+    def _d2(centres):
+        return np.maximum(sq[:, None] - 2.0 * (X @ centres.T) + np.einsum('ij,ij->i', centres, centres), 0.0)
+
+    centres = X[[rng.integers(n)]]
+    closest = _d2(centres)[:, 0]
+    for _ in range(1, n_prototypes):
+        total = closest.sum()
+        pick = rng.choice(n, p=closest / total) if total > 0 else rng.integers(n)
+        centres = np.vstack([centres, X[pick]])
+        closest = np.minimum(closest, _d2(centres[-1:])[:, 0])
+
+    for _ in range(iterations):
+        assign = _d2(centres).argmin(axis=1)
+        for j in range(len(centres)):
+            members = assign == j
+            if members.any():
+                centres[j] = X[members].mean(axis=0)
+
+    return np.unique(_d2(centres).argmin(axis=0))
+
+
+def condense(faces, labels, n_prototypes):
+    """Reduce ``faces``/``labels`` to at most ``n_prototypes`` rows per identity, grouped by label."""
+    labels = [str(x) for x in labels]
+    rows = {}
+    for i, label in enumerate(labels):
+        rows.setdefault(label, []).append(i)
+    keep = []
+    for label, idx in rows.items():
+        idx = np.asarray(idx)
+        keep.append(idx[condense_identity(faces[idx], n_prototypes)])
+    keep = np.concatenate(keep) if keep else np.empty(0, dtype=np.intp)
+    return np.asarray(faces[keep]), [labels[i] for i in keep]
+
+
+def rebuild_prototypes(n_prototypes=None, root=GALLERY_DIR, prototypes_root=PROTOTYPES_DIR):
+    """Re-condense the raw gallery at ``root`` into ``prototypes_root``. Returns the prototype count."""
+    n_prototypes = n_prototypes or PROTOTYPES_PER_IDENTITY
+    if n_prototypes <= 0:
+        raise ValueError('Set GALLERY_PROTOTYPES (or pass n_prototypes) to a positive number')
+    faces, labels = load(root)
+    proto_faces, proto_labels = condense(faces, labels, n_prototypes)
+    write(proto_faces, proto_labels, prototypes_root)
+    print(f"✅ Condensed {len(labels)} samples to {len(proto_labels)} prototypes in {prototypes_root}")
+    return len(proto_labels)
+
+
+def active_root():
+    """Directory the recognizer should match against: prototypes if enabled, else raw samples."""
+    return PROTOTYPES_DIR if PROTOTYPES_PER_IDENTITY > 0 else GALLERY_DIR
+
+
+def ensure_active_gallery(data_dir=DATA_DIR):
+    """``ensure_gallery`` plus building the prototype gallery on first use when enabled."""
+    if not ensure_gallery(data_dir):
+        return False
+    if PROTOTYPES_PER_IDENTITY > 0 and not exists(PROTOTYPES_DIR):
+        rebuild_prototypes()
+    return True
+
+
+def enroll(faces, name):
+    """Save one person's captured samples and return the rows the recognizer should add.
+
+    The raw samples always go to the main gallery; with prototypes enabled
+    the condensed rows are appended to the prototype gallery and returned.
+    """
+    ensure_gallery()
+    faces = _as_rows(faces)
+    append(faces, [name] * len(faces))
+    if PROTOTYPES_PER_IDENTITY <= 0:
+        return faces, [name] * len(faces)
+    if not exists(PROTOTYPES_DIR):
+        rebuild_prototypes()
+        # The rebuild already covers this enrollment
+        keep = condense_identity(faces, PROTOTYPES_PER_IDENTITY)
+        return faces[keep], [name] * len(keep)
+    keep = condense_identity(faces, PROTOTYPES_PER_IDENTITY)
+    append(faces[keep], [name] * len(keep), PROTOTYPES_DIR)
+    return faces[keep], [name] * len(keep)
@@ -0,0 +1,165 @@
+"""Unattended kiosk check-in: follow faces across frames and vote on who each one is.
+
+Every frame, detected faces are matched to existing tracks by box overlap
+(IoU). A track is only sent to the matcher while it is new or its vote is
+still undecided; once one name leads the track's recent votes clearly, the
+track is decided and attendance is written for it once. Tracks that leave
+the frame are forgotten after a few frames.
+"""
+import os
+import threading
+from collections import deque
+
+import recognizer
+
+# Minimum box overlap for a detection to continue an existing track
+KIOSK_IOU = float(os.environ.get('KIOSK_IOU', 0.3))
+# Frames a track survives without a matching detection
+KIOSK_MAX_MISSED = int(os.environ.get('KIOSK_MAX_MISSED', 5))
+# Vote weight a name needs (and its lead over the runner-up, as a multiple) to decide a track
+KIOSK_VOTES = float(os.environ.get('KIOSK_VOTES', recognizer.CONFIRM_FRAMES))
+KIOSK_VOTE_LEAD = 2.0
+# Recent observations kept per track
+KIOSK_VOTE_WINDOW = 8
+# Give up on a track that is still undecided after this many observations
+KIOSK_MAX_OBSERVATIONS = 20
+
+
+def _iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    w = min(ax + aw, bx + bw) - max(ax, bx)
+    h = min(ay + ah, by + bh) - max(ay, by)
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = float(w * h)
+    return inter / (aw * ah + bw * bh - inter)
+
+
+class _Track:
+    def __init__(self, track_id, box):
+        self.id = track_id
+        self.box = box
+        self.missed = 0
+        self.votes = deque(maxlen=KIOSK_VOTE_WINDOW)  # (name or None, weight)
+        self.observations = 0
+        self.name = None
+        self.status = 'new'
+
+    def vote(self, name, weight):
+        self.votes.append((name, weight))
+        self.observations += 1
+
+    def leader(self):
+        """(name, weight, runner-up weight) over the recent votes; unknown (None) competes too."""
+        totals = {}
+        for name, weight in self.votes:
+            totals[name] = totals.get(name, 0.0) + weight
+        ranked = sorted(totals.items(), key=lambda item: -item[1])
+        name, weight = ranked[0]
+        return name, weight, (ranked[1][1] if len(ranked) > 1 else 0.0)
+
+    def as_dict(self):
+        return {"id": self.id, "box": [int(v) for v in self.box], "name": self.name, "status": self.status}
+
+
+class KioskTracker:
+    """Per-terminal face tracks and their identity votes."""
+
+    def __init__(self):
+        self._tracks = []
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.queries = 0  # faces sent to the matcher
+
+    def _associate(self, boxes):
+        """Match detections to tracks greedily by IoU; returns the tracks seen in this frame."""
+        pairs = sorted(((_iou(track.box, box), t, b) for t, track in enumerate(self._tracks)
+                        for b, box in enumerate(boxes)), reverse=True)
+        used_tracks, used_boxes = set(), set()
+        for overlap, t, b in pairs:
+            if overlap < KIOSK_IOU:
+                break
+            if t in used_tracks or b in used_boxes:
+                continue
+            used_tracks.add(t)
+            used_boxes.add(b)
+            self._tracks[t].box = tuple(int(v) for v in boxes[b])
+            self._tracks[t].missed = 0
+
+        for t, track in enumerate(self._tracks):
+            if t not in used_tracks:
+                track.missed += 1
+        for b, box in enumerate(boxes):
+            if b not in used_boxes:
+                self._tracks.append(_Track(self._next_id, tuple(int(v) for v in box)))
+                self._next_id += 1
+        self._tracks = [track for track in self._tracks if track.missed <= KIOSK_MAX_MISSED]
+        return [track for track in self._tracks if track.missed == 0]
+
+    def _decide(self, track):
+        """Settle a track once one name leads its votes clearly, writing attendance once."""
+        name, weight, runner_up = track.leader()
+        if name is None or weight < KIOSK_VOTES or weight < KIOSK_VOTE_LEAD * runner_up:
+            # Unknown faces keep being scored (they may just be turning) until the track gives up
+            track.status = 'unknown' if track.observations >= KIOSK_MAX_OBSERVATIONS else 'identifying'
+            return None
+        track.name = name
+        if not recognizer._is_user_allowed(name):
+            track.status = 'not_allowed'
+        elif not recognizer._should_log(name):
+            track.status = 'cooldown'
+        else:
+            recognizer._write_attendance(name)
+            track.status = 'recorded'
+            return name
+        return None
+
+    def process(self, frame):
+        """Track, recognize and check in the faces in one frame.
+
+        Returns ``{"tracks": [...], "recorded": [...]}`` with every visible
+        track's id, box, name and status, or an error dict.
+        """
+        recognizer._maybe_reload_gallery()
+        matcher = recognizer._knn
+        error = recognizer._not_ready_error(matcher)
+        if error:
+            return error
+
+        boxes = recognizer._detect_all_faces(frame)
+        with self._lock:
+            self.frames += 1
+            visible = self._associate(boxes)
+            # Decided tracks (and ones given up on) are not scored again
+            pending = [track for track in visible if track.status in ('new', 'identifying')]
+            recorded = []
+            if pending:
+                probes = recognizer._crop_probes(frame, [track.box for track in pending])
+                self.queries += len(pending)
+                verdicts = recognizer._verify_group(matcher, probes)
+                for track, (label, accepted, distance, impostor_distance) in zip(pending, verdicts):
+                    # Weighted by the single-user confidence policy
+                    track.vote(label if accepted else None,
+                               recognizer._frame_weight(accepted, distance, impostor_distance))
+                    name = self._decide(track)
+                    if name:
+                        recorded.append(name)
+            return {"tracks": [track.as_dict() for track in visible], "recorded": recorded}
+
+    def stats(self):
+        with self._lock:
+            return {"frames": self.frames, "queries": self.queries, "tracks": len(self._tracks)}
+
+
+_kiosks = {}
+_kiosks_lock = threading.Lock()
+
+
+def get_kiosk(name='default'):
+    """The tracker for terminal ``name``, created on first use."""
+    with _kiosks_lock:
+        if name not in _kiosks:
+            _kiosks[name] = KioskTracker()
+        return _kiosks[name]
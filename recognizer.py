@@ -1,20 +1,90 @@
 import pickle
 import numpy as np
 import os
-import csv
 import time
+import threading
+import atexit
+import queue
 from datetime import datetime, timedelta, timezone
 try:
     from zoneinfo import ZoneInfo
 except Exception:
     ZoneInfo = None
-from sklearn.neighbors import KNeighborsClassifier
+
+import attendance_store
+import detection
+import gallery
+from attendance_writer import AttendanceWriter
+from face_index import make_index
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 ATT_DIR = os.path.join(os.path.dirname(__file__), 'Attendance')
 CASCADE_PATH = os.path.join(DATA_DIR, 'haarcascade_frontalface_default.xml')
 DEFAULT_TIMEZONE_NAME = 'Asia/Kolkata'
 
+# How often (ms) the /detect path checks the gallery header for changes made by other workers
+GALLERY_POLL_MS = int(os.environ.get('GALLERY_POLL_MS', 2000))
+
+# PCA projection applied to gallery rows and probes before matching (0 = match raw pixels)
+PCA_COMPONENTS = int(os.environ.get('PCA_COMPONENTS', 128))
+PCA_WHITEN = os.environ.get('PCA_WHITEN', '').lower() in ('1', 'true', 'yes')
+# Store the in-memory gallery as int8 codes (QuantizedFaceMatcher) instead of float32
+QUANTIZE_GALLERY = os.environ.get('QUANTIZE_GALLERY', '').lower() in ('1', 'true', 'yes')
+# 1:N neighbour search backend: 'exact' (built-in scan), 'lsh' or 'hnsw' (see face_index.py)
+ANN_INDEX = os.environ.get('ANN_INDEX', 'exact').lower()
+# The pure-Python HNSW graph is slower to query than the scan (and slow to build) on smaller galleries
+HNSW_MIN_ROWS = int(os.environ.get('HNSW_MIN_ROWS', 50000))
+# Refit the projection once the gallery has grown by this factor since the last fit
+PCA_REFIT_GROWTH = float(os.environ.get('PCA_REFIT_GROWTH', 2.0))
+PCA_FIT_SAMPLES = 2000
+PROJECTION_FILE = 'projection.npz'
+
+# Optional absolute distance cut-off for 1:1 verification (unset = compare against impostors only).
+# Without it, a probe is accepted when the claimed user's nearest sample beats the impostor
+# reference rows, which hold only IMPOSTOR_ROWS_PER_IDENTITY samples of everyone else. An enrolled
+# person whose few reference rows miss their current pose can still pass as someone who looks alike.
+VERIFY_MAX_DISTANCE = float(os.environ['VERIFY_MAX_DISTANCE']) if os.environ.get('VERIFY_MAX_DISTANCE') else None
+# Evenly spaced samples of every identity kept as impostor references for 1:1 verification;
+# the set grows with headcount so nobody drops out of it
+IMPOSTOR_ROWS_PER_IDENTITY = int(os.environ.get('IMPOSTOR_ROWS_PER_IDENTITY', 8))
+
+# Detection resolution and face-size bounds (see detection.py)
+DETECTION_PROFILE = detection.get_profile()
+
+# Frames needed to confirm the expected user / to give up after mismatches
+CONFIRM_FRAMES = 3
+MISMATCH_FRAMES = 5
+# Confidence policy: a frame's weight towards those counts comes from the ratio of the genuine
+# distance to the closest impostor distance. At or below CONFIDENT_RATIO one frame decides
+# (a clear impostor counts for half of MISMATCH_FRAMES); between BORDERLINE_RATIO and 1 (or its
+# inverse) a frame counts half. CONFIDENCE_POLICY=0 counts every frame as one.
+CONFIDENCE_POLICY = os.environ.get('CONFIDENCE_POLICY', '1').lower() in ('1', 'true', 'yes')
+CONFIDENT_RATIO = float(os.environ.get('CONFIDENT_RATIO', 0.6))
+BORDERLINE_RATIO = float(os.environ.get('BORDERLINE_RATIO', 0.9))
+# Group check-in records a face from a single frame only when its ratio is at or under this
+GROUP_CONFIDENT_RATIO = float(os.environ.get('GROUP_CONFIDENT_RATIO', CONFIDENT_RATIO))
+
+# Face tracking: search this margin (fraction of the last box size) around the previous face
+# before falling back to a full-frame scan, which is forced every ROI_FULL_SCAN_EVERY frames
+ROI_MARGIN = float(os.environ.get('ROI_MARGIN', 0.5))
+ROI_FULL_SCAN_EVERY = int(os.environ.get('ROI_FULL_SCAN_EVERY', 10))
+
+# Run detection and matching in this many worker processes (0 = on the request thread)
+RECOGNIZER_PROCESSES = int(os.environ.get('RECOGNIZER_PROCESSES', 0))
+
+# Capture pacing suggested to the browser with every /detect response (ms between frames)
+PACE_MIN_MS = int(os.environ.get('PACE_MIN_MS', 100))
+PACE_MAX_MS = int(os.environ.get('PACE_MAX_MS', 1000))
+PACE_IDLE_MS = 400  # no face in view, no need to hurry
+# A face box counts as stable when it moves and resizes by less than this fraction of its width
+BOX_STABLE_FRACTION = 0.1
+
+# Reuse the previous frame's outcome when a frame differs from the last processed one by less
+# than this mean absolute difference (gray levels, 16x12 thumbnail; 0 = off), at most
+# DUPLICATE_MAX_REUSE times in a row
+DUPLICATE_FRAME_MAD = float(os.environ.get('DUPLICATE_FRAME_MAD', 3.0))
+DUPLICATE_MAX_REUSE = int(os.environ.get('DUPLICATE_MAX_REUSE', 5))
+
 # In-memory state for each user
 _user_states = {}
 _last_logged_at = {}
@@ -26,11 +96,24 @@ def _fallback_timezone(tz_name):
     return None
 
 
+_tz_cache = (None, None)
+
+
 def _get_app_timezone():
     """Return a tzinfo to use for timestamps.
     Priority: APP_TIMEZONE env var (IANA name) -> TZ env var -> default app timezone -> system local tz -> UTC
+    The tzinfo is resolved once per configured name rather than on every check-in.
     """
+    global _tz_cache
     tz_name = os.environ.get('APP_TIMEZONE') or os.environ.get('TZ') or DEFAULT_TIMEZONE_NAME
+    if _tz_cache[0] == tz_name:
+        return _tz_cache[1]
+    tz = _resolve_timezone(tz_name)
+    _tz_cache = (tz_name, tz)
+    return tz
+
+
+def _resolve_timezone(tz_name):
     if tz_name:
         if ZoneInfo:
             try:
@@ -46,67 +129,565 @@ def _get_app_timezone():
     except Exception:
         return timezone.utc
 
-# Load model and cascade once on startup
-_knn = None
-_face_cascade = None
 
-def _load_model_and_cascade():
-    global _knn, _face_cascade
-    import cv2
+def _identity_key(name):
+    return str(name).lower().strip()
 
-    # Load KNN model if not already loaded
-    if _knn is None:
-        names_path = os.path.join(DATA_DIR, 'names.pkl')
-        faces_path = os.path.join(DATA_DIR, 'faces_data.pkl')
-        if not (os.path.isfile(names_path) and os.path.isfile(faces_path)):
-            raise FileNotFoundError('names.pkl or faces_data.pkl not found in data/. Add faces first.')
 
-        with open(names_path, 'rb') as f:
-            labels = pickle.load(f)
-        with open(faces_path, 'rb') as f:
-            faces = pickle.load(f)
+class Projection:
+    """Fitted PCA projection (optionally whitened) from raw 50x50x3 crops to a compact float32 embedding.
+
+    Saved next to the gallery it was fitted on, so every worker projects
+    into the same space.
+    """
+
+    def __init__(self, mean, components, fitted_on, gallery_id=None):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+        self.fitted_on = int(fitted_on)
+        self.gallery_id = gallery_id
+
+    @property
+    def n_components(self):
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, faces, n_components, whiten=False, max_samples=PCA_FIT_SAMPLES):
+        faces = np.asarray(faces)
+        faces = faces.reshape(faces.shape[0], -1)
+        n = faces.shape[0]
+        if n > max_samples:
+            faces = faces[np.linspace(0, n - 1, max_samples).astype(np.intp)]
+        mean = faces.mean(axis=0, dtype=np.float64)
+        Xc = np.subtract(faces, mean, dtype=np.float32)
+
+        # Eigen-decompose the small Gram matrix instead of the 7500x7500 covariance
+        evals, evecs = np.linalg.eigh((Xc @ Xc.T).astype(np.float64))
+        order = np.argsort(evals)[::-1][:n_components]
+        order = order[evals[order] > evals[order[0]] * 1e-9]
+        evals, evecs = evals[order], evecs[:, order]
+        components = (evecs.T @ Xc) / np.sqrt(evals)[:, None]
+        if whiten:
+            components /= np.sqrt(evals / max(1, Xc.shape[0] - 1))[:, None]
+        return cls(mean, components, fitted_on=n)
+
+    def transform(self, X, chunk=4096):
+        out = np.empty((X.shape[0], self.n_components), dtype=np.float32)
+        for start in range(0, X.shape[0], chunk):
+            rows = np.subtract(X[start:start + chunk], self.mean, dtype=np.float32)
+            np.matmul(rows, self.components.T, out=out[start:start + chunk])
+        return out
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            gallery_id = str(data['gallery_id']) or None
+            return cls(data['mean'], data['components'], int(data['fitted_on']), gallery_id)
+
+    def save(self, path):
+        tmp = f'{path}.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, mean=self.mean, components=self.components,
+                     fitted_on=self.fitted_on, gallery_id=self.gallery_id or '')
+        os.replace(tmp, path)
 
-        # Normalize types
-        try:
-            labels = list(labels)
-        except Exception:
-            labels = [str(x) for x in labels]
 
+class FaceMatcher:
+    """Exact k-nearest-neighbour classifier over a float32 face gallery.
+
+    Gives the same majority vote as ``KNeighborsClassifier(n_neighbors=3)``
+    (ties go to the label that sorts first), but the gallery is converted to
+    float32 once at fit time and every query is a single matmul followed by
+    ``argpartition`` instead of sklearn's per-call validation and dispatch.
+
+    For 1:1 verification it also keeps the row ranges of every identity plus a
+    ``impostors_per_identity`` evenly spaced rows of every identity as impostor
+    references, so ``verify`` compares against everyone enrolled while
+    scanning only a fixed number of rows per person.
+
+    With a ``projection`` every row and probe is first mapped to the PCA
+    embedding, so distances are computed in a few hundred dimensions at most.
+    With an ``index`` kind other than 'exact', 1:N queries go through that
+    ``face_index`` backend instead of the scan; verification is unaffected.
+    The backend is built in a background thread and queries scan until it
+    is ready.
+
+    A fitted matcher is never modified in place: ``with_samples`` returns a
+    new snapshot that shares the preallocated row buffer, so readers holding
+    the old snapshot keep seeing a consistent gallery.
+    """
+
+    def __init__(self, n_neighbors=3, impostors_per_identity=None, projection=None, index=None):
+        self.n_neighbors = n_neighbors
+        self.impostors_per_identity = impostors_per_identity or IMPOSTOR_ROWS_PER_IDENTITY
+        self.projection = projection
+        self.index = None if index in (None, 'exact') else index
+        self._ann = None
+        self.classes_ = np.empty(0, dtype=object)
+        self._class_rank = np.empty(0, dtype=np.intp)
+        self._offset = None
+        self._n = 0
+        self._buffer = np.empty((0, 0), dtype=np.float32)
+        self._norm_buffer = np.empty(0, dtype=np.float32)
+        self._code_buffer = np.empty(0, dtype=np.intp)
+        self._fill = [0]
+        self._ranges = {}
+        self._impostor_gallery = np.empty((0, 0), dtype=np.float32)
+        self._impostor_sq_norms = np.empty(0, dtype=np.float32)
+        self._impostor_codes = np.empty(0, dtype=np.intp)
+        self._impostor_keys = np.empty(0, dtype=object)
+
+    @property
+    def n_samples(self):
+        return self._n
+
+    @property
+    def _gallery(self):
+        return self._buffer[:self._n]
+
+    @property
+    def _sq_norms(self):
+        return self._norm_buffer[:self._n]
+
+    @property
+    def _codes(self):
+        return self._code_buffer[:self._n]
+
+    @staticmethod
+    def _as_rows(faces, labels):
         faces = np.asarray(faces)
         if faces.ndim != 2:
             faces = faces.reshape(faces.shape[0], -1)
+        if faces.shape[0] != len(labels):
+            raise ValueError(f'{faces.shape[0]} face samples vs {len(labels)} labels')
+        return faces, np.asarray([str(label) for label in labels], dtype=object)
+
+    def fit(self, faces, labels):
+        faces, labels = self._as_rows(faces, labels)
+        if faces.shape[0] == 0:
+            raise ValueError('Cannot fit a matcher on an empty gallery')
+        self.classes_, codes = np.unique(labels, return_inverse=True)
+        self._class_rank = np.arange(len(self.classes_))
+
+        # Centre on the gallery mean so the expanded distance below keeps its
+        # precision in float32 (raw pixel norms are ~1e8). The offset stays
+        # fixed for later appends; any constant offset gives exact distances.
+        # A projection already centres on its own mean.
+        if self.projection is None:
+            self._offset = faces.mean(axis=0, dtype=np.float64).astype(np.float32)
+        prepared = self._prepare(faces)
+        self._calibrate(prepared)
+        self._buffer = self._encode(prepared)
+        self._norm_buffer = self._row_norms(self._buffer)
+        self._code_buffer = codes.astype(np.intp)
+        self._n = faces.shape[0]
+        self._fill = [self._n]
+        self._ranges = {}
+        self._add_ranges(0)
+        self._select_impostors()
+        if self.index:
+            self._build_ann()
+        return self
+
+    def with_samples(self, faces, labels):
+        """Return a new snapshot with ``faces``/``labels`` appended, in O(new samples).
+
+        Rows are written into spare capacity of the shared buffer (doubling it
+        when full); this snapshot keeps viewing only its own rows.
+        """
+        faces, labels = self._as_rows(faces, labels)
+        if self._n == 0:
+            return self._spawn().fit(faces, labels)
+        new = self._spawn()
+        new._offset = self._offset
+
+        classes = list(self.classes_)
+        index = {label: code for code, label in enumerate(classes)}
+        codes = np.empty(len(labels), dtype=np.intp)
+        for i, label in enumerate(labels):
+            if label not in index:
+                index[label] = len(classes)
+                classes.append(label)
+            codes[i] = index[label]
+        new.classes_ = np.asarray(classes, dtype=object)
+        if len(classes) == len(self.classes_):
+            new._class_rank = self._class_rank
+        else:
+            new._class_rank = np.argsort(np.argsort(new.classes_))
 
-        # If counts mismatch, trim to the smaller length and persist fix
-        n_labels = len(labels)
-        n_faces = faces.shape[0] if faces.ndim >= 1 else 0
-        if n_labels != n_faces:
-            m = min(n_labels, n_faces)
-            print(f"⚠️  Mismatch: {n_faces} face samples vs {n_labels} labels. Trimming to {m} entries.")
+        n, m = self._n, faces.shape[0]
+        if self._fill[0] == n and n + m <= self._buffer.shape[0]:
+            # Only the newest snapshot may write into the shared spare rows
+            new._buffer, new._norm_buffer, new._code_buffer = self._buffer, self._norm_buffer, self._code_buffer
+            new._fill = self._fill
+        else:
+            capacity = max(2 * (n + m), 64)
+            new._buffer = np.empty((capacity, self._buffer.shape[1]), dtype=self._buffer.dtype)
+            new._norm_buffer = np.empty(capacity, dtype=np.float32)
+            new._code_buffer = np.empty(capacity, dtype=np.intp)
+            new._buffer[:n] = self._gallery
+            new._norm_buffer[:n] = self._sq_norms
+            new._code_buffer[:n] = self._codes
+            new._fill = [n]
+
+        rows = new._buffer[n:n + m]
+        rows[:] = self._encode(self._prepare(faces))
+        new._norm_buffer[n:n + m] = self._row_norms(rows)
+        new._code_buffer[n:n + m] = codes
+        new._n = n + m
+        new._fill[0] = n + m
+
+        new._ranges = {key: list(ranges) for key, ranges in self._ranges.items()}
+        new._add_ranges(n)
+        new._select_impostors()
+        if self.index:
+            if self._ann is not None and len(self._ann) == n:
+                # Older snapshots pass limit=n to queries, so they never see these ids
+                new._build_ann(base=self._ann, rows=self._decode(rows))
+            else:
+                new._build_ann()
+        return new
+
+    def _build_ann(self, base=None, rows=None):
+        """Build this snapshot's ANN index (or extend ``base`` with ``rows``) off the calling thread.
+
+        Index construction can take seconds to minutes; until it finishes
+        ``_ann`` stays None and queries use the exact scan.
+        """
+        vectors = self._decode(self._gallery) if base is None else rows
+
+        def build():
+            start = time.perf_counter()
             try:
-                labels = labels[:m]
-                faces = faces[:m]
-                with open(names_path, 'wb') as f:
-                    pickle.dump(labels, f)
-                with open(faces_path, 'wb') as f:
-                    pickle.dump(faces, f)
-                print("✅ Trimmed and saved corrected `names.pkl` and `faces_data.pkl`")
+                if base is None:
+                    index = make_index(self.index).build(vectors)
+                else:
+                    index = base
+                    index.add(vectors)
             except Exception as e:
-                print(f"⚠️  Failed to persist trimmed data: {e}")
+                print(f"[WARN] Building the {self.index} index failed; queries keep using the exact scan: {e}")
+                return
+            self._ann = index
+            print(f"[MODEL] {self.index} index ready: {len(vectors)} rows in {time.perf_counter() - start:.1f}s")
+
+        threading.Thread(target=build, name=f'{self.index}-index', daemon=True).start()
+
+    def _add_ranges(self, start_row):
+        """Index the contiguous identity runs from ``start_row`` onwards."""
+        codes = self._codes[start_row:]
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(codes)) + 1)) + start_row
+        stops = np.append(starts[1:], self._n)
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            key = _identity_key(self.classes_[self._code_buffer[start]])
+            self._ranges.setdefault(key, []).append((start, stop))
+
+    def _select_impostors(self):
+        """Pick ``impostors_per_identity`` evenly spaced rows of every identity."""
+        per_identity = max(1, self.impostors_per_identity)
+        rows = []
+        for ranges in self._ranges.values():
+            lengths = np.array([stop - start for start, stop in ranges])
+            ends = np.cumsum(lengths)
+            pos = np.linspace(0, ends[-1] - 1, min(per_identity, ends[-1])).astype(np.intp)
+            run = np.searchsorted(ends, pos, side='right')
+            starts = np.array([start for start, _ in ranges])
+            rows.append(starts[run] + pos - (ends[run] - lengths[run]))
+        rows = np.concatenate(rows)
+
+        self._impostor_gallery = np.ascontiguousarray(self._decode(self._gallery[rows]))
+        self._impostor_sq_norms = np.einsum('ij,ij->i', self._impostor_gallery, self._impostor_gallery)
+        self._impostor_codes = self._codes[rows]
+        self._impostor_keys = np.array([_identity_key(self.classes_[c]) for c in self._impostor_codes], dtype=object)
+
+    def labels_match(self, labels):
+        """True if ``labels`` equals this snapshot's row labels, in order."""
+        if len(labels) != self._n:
+            return False
+        return bool(np.array_equal(self.classes_[self._codes], np.asarray(labels, dtype=object)))
+
+    def has_identity(self, label):
+        return _identity_key(label) in self._ranges
+
+    def _spawn(self):
+        """Empty matcher with the same configuration, used for new snapshots."""
+        return FaceMatcher(self.n_neighbors, self.impostors_per_identity, self.projection, self.index)
+
+    # Storage hooks: the float32 gallery stores prepared rows as they are.
+    def _calibrate(self, prepared):
+        pass
+
+    def _encode(self, prepared):
+        return prepared
+
+    def _decode(self, rows):
+        return rows
+
+    def _row_norms(self, rows):
+        return np.einsum('ij,ij->i', rows, rows)
+
+    def _search_d2(self, q):
+        """Ranking scores for every row: ||g||^2 - 2 q.g (||q||^2 is constant per probe)."""
+        d2 = q @ self._gallery.T
+        d2 *= -2.0
+        d2 += self._sq_norms
+        return d2
+
+    def _n_candidates(self, k):
+        return k
+
+    def _exact_d2(self, q, idx, scores):
+        """Squared distances of the candidates ``idx`` given their ranking ``scores``."""
+        return scores + np.einsum('ij,ij->i', q, q)[:, None]
+
+    def _rows_d2(self, Q, start, stop):
+        """||g||^2 - 2 q.g for every probe in ``Q`` over gallery rows [start, stop)."""
+        return self._sq_norms[start:stop] - 2.0 * (Q @ self._gallery[start:stop].T)
+
+    def _prepare(self, X):
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        elif X.ndim != 2:
+            X = X.reshape(X.shape[0], -1)
+        if self.projection is not None:
+            return self.projection.transform(X)
+        return np.subtract(X, self._offset, dtype=np.float32)
+
+    def kneighbors(self, X, n_neighbors=None):
+        """Return ``(distances, indices)`` of the nearest gallery rows, closest first."""
+        if self.n_samples == 0:
+            raise RuntimeError('Matcher has not been fitted')
+        k = min(n_neighbors or self.n_neighbors, self.n_samples)
+        r = min(self._n_candidates(k), self.n_samples)
+        q = self._prepare(X)
+
+        if self._ann is not None:
+            d2, idx = self._ann.query(q, k, limit=self._n)
+            missing = idx < 0
+            if missing.any():
+                idx = np.where(missing, idx[:, :1], idx)
+                d2 = np.where(missing, d2[:, :1], d2)
+            return np.sqrt(np.maximum(d2, 0.0)), idx
+
+        # ||q - g||^2 = ||q||^2 - 2 q.g + ||g||^2; ||q||^2 does not change the
+        # ranking, so it is only added back for the survivors.
+        d2 = self._search_d2(q)
+        if r < d2.shape[1]:
+            idx = np.argpartition(d2, r - 1, axis=1)[:, :r]
+        else:
+            idx = np.broadcast_to(np.arange(d2.shape[1]), d2.shape)
+        part = self._exact_d2(q, idx, np.take_along_axis(d2, idx, axis=1))
+        order = np.argsort(part, axis=1)[:, :k]
+        idx = np.take_along_axis(idx, order, axis=1)
+        part = np.take_along_axis(part, order, axis=1)
+        return np.sqrt(np.maximum(part, 0.0)), idx
+
+    def predict(self, X):
+        return self.predict_with_distance(X)[0]
+
+    def predict_with_distance(self, X):
+        """Return voted labels plus each probe's distance to its nearest neighbour."""
+        dist, idx = self.kneighbors(X)
+        codes = self._codes[idx]
+        n_classes = len(self.classes_)
+        votes = np.zeros((codes.shape[0], n_classes), dtype=np.intp)
+        np.add.at(votes, (np.arange(codes.shape[0])[:, None], codes), 1)
+        # Break ties in favour of the label that sorts first, like sklearn
+        votes = votes * n_classes + (n_classes - 1 - self._class_rank)
+        return self.classes_[votes.argmax(axis=1)], dist[:, 0]
+
+    def verify(self, x, label, max_distance=None):
+        """1:1 check of a single probe against ``label``'s own gallery rows.
+
+        The probe is accepted when its nearest genuine sample is closer than
+        every impostor reference row (and within ``max_distance`` if given).
+        Returns ``(accepted, distance, closest_impostor_label, impostor_distance)``,
+        or None when ``label`` is not enrolled.
+        """
+        results = self.verify_batch(x, label, max_distance)
+        return None if results is None else results[0]
+
+    def verify_batch(self, X, label, max_distance=None):
+        """``verify`` for every probe row of ``X`` in one pass; returns a list of tuples or None."""
+        key = _identity_key(label)
+        ranges = self._ranges.get(key)
+        if not ranges:
+            return None
+        Q = self._prepare(X)
+        q_sq = np.einsum('ij,ij->i', Q, Q)
+
+        genuine = np.min(np.stack([self._rows_d2(Q, start, stop).min(axis=1) for start, stop in ranges]), axis=0)
+        distances = np.sqrt(np.maximum(genuine + q_sq, 0.0))
+
+        impostor_d2 = np.full(len(Q), np.inf)
+        impostor_labels = [None] * len(Q)
+        others = self._impostor_keys != key
+        if others.any():
+            d2 = self._impostor_sq_norms[others] - 2.0 * (Q @ self._impostor_gallery[others].T)
+            nearest = d2.argmin(axis=1)
+            impostor_d2 = d2[np.arange(len(Q)), nearest]
+            codes = self._impostor_codes[others][nearest]
+            impostor_labels = [str(self.classes_[c]) for c in codes]
+
+        impostor_distances = np.sqrt(np.maximum(impostor_d2 + q_sq, 0.0))
+        results = []
+        for g, imp, distance, imp_label, imp_distance in zip(genuine.tolist(), impostor_d2.tolist(), distances.tolist(),
+                                                             impostor_labels, impostor_distances.tolist()):
+            accepted = g < imp and (max_distance is None or distance <= max_distance)
+            results.append((accepted, distance, None if accepted else imp_label, imp_distance))
+        return results
+
+
+class QuantizedFaceMatcher(FaceMatcher):
+    """FaceMatcher that keeps the gallery as int8 codes with a per-dimension scale/offset.
+
+    Candidates are scored block by block: each cache-sized run of int8 rows
+    is cast into a reused float32 buffer and multiplied by the scaled probe
+    with BLAS, and the best ``rerank`` candidates are then re-scored against
+    their dequantized rows. Resident gallery memory is a quarter of the
+    float32 matcher's; query time is about the same, not faster.
+    """
+
+    # Bytes of float32 rows cast per block; small enough to stay in L2
+    BLOCK_BYTES = 1 << 20
+
+    def __init__(self, n_neighbors=3, impostors_per_identity=None, projection=None, index=None, rerank=32):
+        super().__init__(n_neighbors, impostors_per_identity, projection, index)
+        self.rerank = rerank
+        self._qscale = None
+        self._qoffset = None
+
+    def _spawn(self):
+        new = QuantizedFaceMatcher(self.n_neighbors, self.impostors_per_identity, self.projection, self.index, self.rerank)
+        new._qscale, new._qoffset = self._qscale, self._qoffset
+        return new
+
+    def _calibrate(self, prepared):
+        lo, hi = prepared.min(axis=0), prepared.max(axis=0)
+        self._qoffset = ((hi + lo) / 2.0).astype(np.float32)
+        scale = ((hi - lo) / 254.0).astype(np.float32)
+        scale[scale == 0] = 1.0
+        self._qscale = scale
+
+    def _encode(self, prepared):
+        # Rows appended later may fall outside the fitted range; they are clipped
+        return np.clip(np.rint((prepared - self._qoffset) / self._qscale), -127, 127).astype(np.int8)
+
+    def _decode(self, rows):
+        return rows.astype(np.float32) * self._qscale + self._qoffset
+
+    def _row_norms(self, rows):
+        # ||s * code||^2, i.e. the dequantized row's squared norm around the offset
+        scaled = rows.astype(np.float32) * self._qscale
+        return np.einsum('ij,ij->i', scaled, scaled)
+
+    def _search_d2(self, q):
+        # ||p - g||^2 = ||p - o||^2 - 2 (p - o).(s * code) + ||s * code||^2
+        w = ((q - self._qoffset) * self._qscale).astype(np.float32)
+        codes = self._gallery
+        n, d = codes.shape
+        rows = max(16, self.BLOCK_BYTES // (4 * d))
+        block = np.empty((min(rows, n), d), dtype=np.float32)
+        cross = np.empty((q.shape[0], n), dtype=np.float32)
+        for r0 in range(0, n, rows):
+            r1 = min(n, r0 + rows)
+            np.copyto(block[:r1 - r0], codes[r0:r1], casting='unsafe')
+            np.matmul(w, block[:r1 - r0].T, out=cross[:, r0:r1])
+        cross *= -2.0
+        cross += self._sq_norms
+        return cross
+
+    def _n_candidates(self, k):
+        return max(k, self.rerank)
+
+    def _exact_d2(self, q, idx, scores):
+        rows = self._decode(self._gallery[idx])
+        diff = rows - q[:, None, :]
+        return np.einsum('ijk,ijk->ij', diff, diff)
+
+    def _rows_d2(self, Q, start, stop):
+        rows = self._decode(self._gallery[start:stop])
+        return np.einsum('ij,ij->i', rows, rows) - 2.0 * (Q @ rows.T)
+
+
+# Load model and cascade once on startup. _knn always points at a complete
+# FaceMatcher snapshot; updates build a new snapshot and swap the reference.
+_knn = None
+_knn_lock = threading.Lock()
+_knn_generation = None  # (generation, id) of the gallery header _knn was built from
+_detectors = None  # detection.DetectorPool of cascade classifiers
+
+_last_generation_check = 0.0
+_reload_lock = threading.Lock()
+
+
+def _load_projection(faces, header):
+    """Return the projection saved next to the active gallery, refitting it when it is
+    missing, belongs to a rewritten gallery, or the gallery outgrew it."""
+    if PCA_COMPONENTS <= 0 or len(faces) < 2:
+        return None
+    path = os.path.join(gallery.active_root(), PROJECTION_FILE)
+    projection = None
+    if os.path.isfile(path):
+        try:
+            projection = Projection.load(path)
+        except Exception as e:
+            print(f"[WARN] Ignoring unreadable projection {path}: {e}")
+    if (projection is None or projection.gallery_id != header.get('id')
+            or len(faces) > projection.fitted_on * PCA_REFIT_GROWTH):
+        projection = Projection.fit(faces, PCA_COMPONENTS, whiten=PCA_WHITEN)
+        projection.gallery_id = header.get('id')
+        projection.fitted_on = len(faces)
+        try:
+            projection.save(path)
+        except Exception as e:
+            print(f"[WARN] Could not save projection: {e}")
+        print(f"[MODEL] Fitted {projection.n_components}-d projection on {len(faces)} samples")
+    return projection
+
+
+def _projection_outgrown(matcher, n_total):
+    projection = matcher.projection
+    if projection is None:
+        return PCA_COMPONENTS > 0  # gallery was too small to fit one before
+    return n_total > projection.fitted_on * PCA_REFIT_GROWTH
+
+
+def _build_matcher(faces, labels, header):
+    matcher_cls = QuantizedFaceMatcher if QUANTIZE_GALLERY else FaceMatcher
+    index = ANN_INDEX
+    if index == 'hnsw' and len(faces) < HNSW_MIN_ROWS:
+        print(f"⚠️  ANN_INDEX=hnsw needs at least HNSW_MIN_ROWS={HNSW_MIN_ROWS} samples to beat the exact scan; "
+              f"using exact for {len(faces)} samples")
+        index = 'exact'
+    return matcher_cls(n_neighbors=3, projection=_load_projection(faces, header), index=index).fit(faces, labels)
+
+
+def _load_model_and_cascade():
+    global _knn, _knn_generation, _detectors
+    import cv2
+
+    # Load KNN model if not already loaded
+    if _knn is None:
+        # Gallery rows stay memory-mapped and shared; the matcher's prepared copy (PCA
+        # embedding, or float32 pixels with PCA_COMPONENTS=0) is private to this process
+        if not gallery.ensure_active_gallery(DATA_DIR):
+            raise FileNotFoundError('No face gallery in data/gallery/ and no names.pkl/faces_data.pkl to migrate. Add faces first.')
+        header, faces, labels = gallery.load_snapshot(gallery.active_root())
 
         # Fit KNN
         try:
-            knn = KNeighborsClassifier(n_neighbors=3)
-            knn.fit(faces, labels)
+            knn = _build_matcher(faces, labels, header)
             _knn = knn
+            _knn_generation = (header.get('generation', 0), header.get('id'))
         except Exception as e:
             raise RuntimeError(f"Failed to fit recognition model: {e}")
 
-    # Load cascade
+    # Load cascade (parsed once per pooled instance from the XML read here)
     cascade_loaded = False
     try:
-        _face_cascade = cv2.CascadeClassifier(CASCADE_PATH)
-        if not _face_cascade.empty():
-            cascade_loaded = True
+        _detectors = detection.DetectorPool.from_file(CASCADE_PATH)
+        cascade_loaded = True
     except Exception:
         pass
 
@@ -114,9 +695,8 @@ def _load_model_and_cascade():
         # Try OpenCV builtin
         try:
             builtin_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-            _face_cascade = cv2.CascadeClassifier(builtin_path)
-            if not _face_cascade.empty():
-                cascade_loaded = True
+            _detectors = detection.DetectorPool.from_file(builtin_path)
+            cascade_loaded = True
         except Exception:
             pass
 
@@ -133,17 +713,87 @@ except Exception as _startup_err:
     print(f"[WARN] Could not load face recognition model on startup: {_startup_err}")
     print("[WARN] Face recognition will be unavailable until data files are present in data/.")
 
-def _today_csv_path():
-    tz = _get_app_timezone()
-    date = datetime.now(tz).strftime('%d-%m-%Y')
-    return os.path.join(ATT_DIR, f'Attendance_{date}.csv')
 
-def _ensure_csv_header(path):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    if not os.path.isfile(path):
-        with open(path, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(['NAME', 'TIME'])
+def _sync_with_gallery():
+    """Bring _knn up to date with the on-disk gallery. Caller holds _knn_lock.
+
+    If the gallery was only appended to since _knn was built, just the new
+    rows are added; a rewritten gallery is refitted from scratch.
+    """
+    global _knn, _knn_generation
+    header, faces, labels = gallery.load_snapshot(gallery.active_root())
+    stamp = (header.get('generation', 0), header.get('id'))
+    if stamp == _knn_generation:
+        return
+    current = _knn
+    n = current.n_samples if current is not None else 0
+    if (current is not None and _knn_generation is not None and stamp[1] == _knn_generation[1]
+            and len(labels) >= n and current.labels_match(labels[:n])
+            and not _projection_outgrown(current, len(labels))):
+        if len(labels) > n:
+            _knn = current.with_samples(faces[n:], labels[n:])
+    else:
+        _knn = _build_matcher(faces, labels, header)
+    _knn_generation = stamp
+    print(f"[MODEL] Gallery generation {stamp[0]} loaded; {_knn.n_samples} samples")
+
+
+def _reload_in_background():
+    try:
+        with _knn_lock:
+            if _knn is None:
+                _load_model_and_cascade()
+            else:
+                _sync_with_gallery()
+    except Exception as e:
+        print(f"[WARN] Gallery reload failed: {e}")
+    finally:
+        _reload_lock.release()
+
+
+def _maybe_reload_gallery():
+    """At most every GALLERY_POLL_MS, compare the gallery header's generation with
+    the one _knn was built from and, if it moved, rebuild in a background thread.
+    """
+    global _last_generation_check
+    now = time.monotonic()
+    if now - _last_generation_check < GALLERY_POLL_MS / 1000.0:
+        return
+    _last_generation_check = now
+    generation, gallery_id = gallery.read_generation(gallery.active_root())
+    if generation is None or (generation, gallery_id) == _knn_generation:
+        return
+    if not _reload_lock.acquire(blocking=False):
+        return  # a reload is already running
+    threading.Thread(target=_reload_in_background, daemon=True).start()
+
+
+def add_samples(faces, labels):
+    """Publish newly enrolled samples to the live matcher without a refit or restart.
+
+    The samples must already be appended to the gallery. Concurrent requests
+    keep using the snapshot they started with and pick up the new one on
+    their next frame.
+    """
+    global _knn, _knn_generation
+    with _knn_lock:
+        if _knn is None:
+            # Nothing was loadable at startup; the gallery now has data
+            _load_model_and_cascade()
+        else:
+            generation, gallery_id = gallery.read_generation(gallery.active_root())
+            if (_knn_generation is not None and gallery_id == _knn_generation[1]
+                    and generation == _knn_generation[0] + 1
+                    and not _projection_outgrown(_knn, _knn.n_samples + len(labels))):
+                # Ours is the only change since _knn was built
+                _knn = _knn.with_samples(faces, labels)
+                _knn_generation = (generation, gallery_id)
+            else:
+                _sync_with_gallery()
+    print(f"[MODEL] Added {len(labels)} samples; gallery now has {_knn.n_samples} samples")
+
+# Check-ins are appended to the daily CSV and the attendance store by a background thread (see attendance_writer.py)
+_attendance_writer = AttendanceWriter(ATT_DIR, store=attendance_store.get_store)
 
 def _should_log(name: str, cooldown_seconds: int = 60) -> bool:
     now = datetime.now(_get_app_timezone())
@@ -153,52 +803,140 @@ def _should_log(name: str, cooldown_seconds: int = 60) -> bool:
     return False
 
 def _write_attendance(name: str):
-    path = _today_csv_path()
-    _ensure_csv_header(path)
     now = datetime.now(_get_app_timezone())
     ts = now.strftime('%H:%M:%S')
-    with open(path, 'a', newline='', encoding='utf-8') as f:
-        csv.writer(f).writerow([name, ts])
+    _attendance_writer.write(name, now)
     _last_logged_at[name] = now
     print(f"[WRITE] Attendance written: {name} at {ts}")
 
-def recognize_frame(frame, expected_user):
-    import cv2
+def _not_ready_error(matcher):
+    if matcher is not None and _detectors is not None:
+        return None
+    error_msg = "Model or cascade not loaded"
+    if matcher is None and _detectors is None:
+        error_msg = "Neither model nor cascade loaded. Check data files and cascade file."
+    elif matcher is None:
+        error_msg = "Face recognition model not loaded. Check the face gallery in data/gallery/."
+    elif _detectors is None:
+        error_msg = "Face detection cascade not loaded. Check haarcascade_frontalface_default.xml file."
+    return {"error": error_msg}
 
-    if _knn is None or _face_cascade is None:
-        error_msg = "Model or cascade not loaded"
-        if _knn is None and _face_cascade is None:
-            error_msg = "Neither model nor cascade loaded. Check data files and cascade file."
-        elif _knn is None:
-            error_msg = "Face recognition model not loaded. Check faces_data.pkl and names.pkl files."
-        elif _face_cascade is None:
-            error_msg = "Face detection cascade not loaded. Check haarcascade_frontalface_default.xml file."
-        return {"error": error_msg}
-
-    state = _user_states.setdefault(expected_user, {
+
+def _user_state(expected_user):
+    return _user_states.setdefault(expected_user, {
         'confirm_count': 0,
         'mismatch_count': 0,
-        'mismatch_name': None
+        'mismatch_name': None,
+        'face_box': None,  # last detected face (x, y, w, h), for ROI tracking
+        'frames_since_scan': 0,
+        'box_stable': False
     })
 
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    faces = _face_cascade.detectMultiScale(gray, 1.1, 5)
 
-    if len(faces) == 0:
-        return {"status": "No face detected"}
+def _roi_window(box, shape):
+    """Search window around ``box`` grown by ROI_MARGIN on every side, clipped to the frame."""
+    x, y, w, h = box
+    mx, my = int(w * ROI_MARGIN), int(h * ROI_MARGIN)
+    return max(x - mx, 0), max(y - my, 0), min(x + w + mx, shape[1]), min(y + h + my, shape[0])
 
-    x, y, w, h = faces[0]
+
+def _box_stable(previous, box):
+    if previous is None or box is None:
+        return False
+    tolerance = BOX_STABLE_FRACTION * previous[2]
+    return (abs((box[0] + box[2] / 2) - (previous[0] + previous[2] / 2)) <= tolerance
+            and abs((box[1] + box[3] / 2) - (previous[1] + previous[3] / 2)) <= tolerance
+            and abs(box[2] - previous[2]) <= tolerance)
+
+
+def _locate_face(gray, state=None):
+    """Face box in ``gray``, searching around the box tracked in ``state`` first.
+
+    A full-frame scan runs when nothing is tracked yet, when the window
+    misses, and every ROI_FULL_SCAN_EVERY frames so a second face or a
+    drifting box is still picked up.
+    """
+    box = state.get('face_box') if state is not None else None
+    if box is not None and state.get('frames_since_scan', 0) < ROI_FULL_SCAN_EVERY:
+        x0, y0, x1, y1 = _roi_window(box, gray.shape)
+        with _detectors.checkout() as cascade:
+            faces = DETECTION_PROFILE.detect(cascade, gray[y0:y1, x0:x1], 1.1, 5,
+                                             min_size=(box[2] // 2, box[3] // 2), frame_shape=gray.shape)
+        if len(faces):
+            x, y, w, h = (int(v) for v in faces[0])
+            state['box_stable'] = _box_stable(box, (x + x0, y + y0, w, h))
+            state['face_box'] = (x + x0, y + y0, w, h)
+            state['frames_since_scan'] += 1
+            return state['face_box']
+
+    with _detectors.checkout() as cascade:
+        faces = DETECTION_PROFILE.detect(cascade, gray, 1.1, 5)
+    found = tuple(int(v) for v in faces[0]) if len(faces) else None
+    if state is not None:
+        state['box_stable'] = _box_stable(box, found)
+        state['face_box'] = found
+        state['frames_since_scan'] = 0
+    return found
+
+
+def _detect_probe(frame, state=None):
+    """Detect the user's face in ``frame`` and return its flattened 50x50 crop, or None."""
+    import cv2
+
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    box = _locate_face(gray, state)
+    if box is None:
+        return None
+
+    x, y, w, h = box
     crop = frame[y:y+h, x:x+w, :]
-    resized = cv2.resize(crop, (50, 50)).flatten().reshape(1, -1)
+    return cv2.resize(crop, (50, 50)).reshape(-1)
+
+
+def _frame_weight(accepted, distance, impostor_distance):
+    """How much one verified frame counts towards CONFIRM_FRAMES or MISMATCH_FRAMES."""
+    if not CONFIDENCE_POLICY or not np.isfinite(impostor_distance) or impostor_distance <= 0:
+        return 1.0
+    ratio = distance / impostor_distance
+    if accepted:
+        if ratio <= CONFIDENT_RATIO:
+            return float(CONFIRM_FRAMES)
+        return 0.5 if ratio >= BORDERLINE_RATIO else 1.0
+    if ratio >= 1.0 / CONFIDENT_RATIO:
+        return MISMATCH_FRAMES / 2.0
+    return 0.5 if ratio <= 1.0 / BORDERLINE_RATIO else 1.0
+
 
-    recognized_name = str(_knn.predict(resized)[0])
+def _distance_ratio(distance, impostor_distance):
+    """Genuine/impostor distance ratio; inf (never confident) when there is no impostor to compare against."""
+    if 0 < impostor_distance < np.inf:
+        return distance / impostor_distance
+    return np.inf
 
+
+def _identify(matcher, probes, expected_user):
+    """``(name, weight)`` recognized for each probe row, all scored in one vectorized query.
+
+    1:1 verification against the expected user's samples, weighted by the
+    confidence policy; fall back to an unweighted 1:N vote when that user
+    has no face samples enrolled.
+    """
+    verdicts = matcher.verify_batch(probes, expected_user, max_distance=VERIFY_MAX_DISTANCE)
+    if verdicts is None:
+        return [(str(name), 1.0) for name in matcher.predict(probes)]
+    return [(expected_user if accepted else (impostor_name or 'Unknown'),
+             _frame_weight(accepted, distance, impostor_distance))
+            for accepted, distance, impostor_name, impostor_distance in verdicts]
+
+
+def _apply_decision(state, expected_user, recognized_name, weight=1.0):
+    """Advance the confirm/mismatch state machine by one recognized frame counting ``weight`` frames."""
     if recognized_name.lower().strip() == expected_user.lower().strip():
-        state['confirm_count'] += 1
+        state['confirm_count'] += weight
         state['mismatch_count'] = 0
         state['mismatch_name'] = None
 
-        if state['confirm_count'] >= 3:
+        if state['confirm_count'] >= CONFIRM_FRAMES:
             # Before writing attendance, verify user is allowed
             if not _is_user_allowed(expected_user):
                 state['confirm_count'] = 0
@@ -218,10 +956,10 @@ def recognize_frame(frame, expected_user):
                 return {"status": "Attendance already recorded recently."}
     else:
         state['confirm_count'] = 0
-        state['mismatch_count'] += 1
+        state['mismatch_count'] += weight
         state['mismatch_name'] = recognized_name
 
-        if state['mismatch_count'] >= 5:
+        if state['mismatch_count'] >= MISMATCH_FRAMES:
             state['mismatch_count'] = 0
             return {
                 "recognition_failed": True,
@@ -232,6 +970,377 @@ def recognize_frame(frame, expected_user):
     return {"status": "Recognition in progress"}
 
 
+def _is_final(result):
+    return bool(result.get("attendance_recorded") or result.get("attendance_denied") or result.get("recognition_failed"))
+
+
+def _recognize_names(frames, expected_user, roi):
+    """``(name, weight)`` recognized in each frame (None where no face was found), or an error dict.
+
+    ``roi`` holds the face-tracking fields of the user's state and is
+    updated in place. Faces are detected per frame and all crops are scored
+    in one vectorized query.
+    """
+    _maybe_reload_gallery()
+    matcher = _knn  # one consistent snapshot for the whole batch
+    error = _not_ready_error(matcher)
+    if error:
+        return error, None
+
+    probes = [_detect_probe(frame, roi) for frame in frames]
+    found = [p for p in probes if p is not None]
+    names = iter(_identify(matcher, np.vstack(found), expected_user)) if found else iter(())
+    return None, [None if p is None else next(names) for p in probes]
+
+
+def _recognize_shared(shm_name, shape, expected_user, roi):
+    """Worker-process entry point: ``_recognize_names`` over frames stacked in a shared memory block."""
+    from multiprocessing import shared_memory
+
+    # Attach only; the front process owns the block and unlinks it
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        frames = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        error, names = _recognize_names(frames, expected_user, roi)
+        del frames
+        return error, names, roi
+    finally:
+        shm.close()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Process pool for RECOGNIZER_PROCESSES; each worker imports this module and loads the gallery once."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            _executor = ProcessPoolExecutor(max_workers=RECOGNIZER_PROCESSES,
+                                            mp_context=multiprocessing.get_context('spawn'))
+            atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+            print(f"[RECOGNIZER] Started {RECOGNIZER_PROCESSES} recognition worker processes")
+        return _executor
+
+
+def _recognize_in_pool(frames, expected_user, state):
+    """Ship ``frames`` to a worker through shared memory; tracking state stays in this process."""
+    from multiprocessing import shared_memory
+
+    shape = (len(frames),) + frames[0].shape
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+    try:
+        stacked = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        for i, frame in enumerate(frames):
+            stacked[i] = frame
+        del stacked
+        roi = {key: state.get(key) for key in ('face_box', 'frames_since_scan', 'box_stable')}
+        roi['frames_since_scan'] = roi['frames_since_scan'] or 0
+        error, names, roi = _get_executor().submit(_recognize_shared, shm.name, shape, expected_user, roi).result()
+        state.update(roi)
+        return error, names
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _dispatch_recognition(frames, expected_user, state):
+    same_shape = all(f.shape == frames[0].shape and f.dtype == np.uint8 for f in frames)
+    if RECOGNIZER_PROCESSES > 0 and same_shape:
+        try:
+            return _recognize_in_pool(frames, expected_user, state)
+        except Exception as e:
+            print(f"[WARN] Recognition worker failed, processing in-thread: {e}")
+    return _recognize_names(frames, expected_user, state)
+
+
+def _fingerprint(frame):
+    """16x12 grayscale thumbnail used to spot near-identical consecutive frames."""
+    import cv2
+    return cv2.cvtColor(cv2.resize(frame, (16, 12), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+
+def _dedupe_frames(frames, state):
+    """Split ``frames`` into ones to process and ones that repeat the last processed frame.
+
+    Returns (indices to process, source per frame) where the source is the
+    frame's own index, or -1 for a frame that repeats the last processed one.
+    """
+    keep, sources = [], []
+    last = -1
+    for i, frame in enumerate(frames):
+        fingerprint = _fingerprint(frame)
+        previous = state.get('fingerprint')
+        if (DUPLICATE_FRAME_MAD > 0 and previous is not None and previous.shape == fingerprint.shape
+                and state.get('reused', 0) < DUPLICATE_MAX_REUSE
+                and (last >= 0 or 'last_result' in state)
+                and np.abs(fingerprint - previous).mean() < DUPLICATE_FRAME_MAD):
+            state['reused'] = state.get('reused', 0) + 1
+            sources.append(-1)
+            continue
+        state['fingerprint'] = fingerprint
+        state['reused'] = 0
+        keep.append(i)
+        sources.append(i)
+        last = i
+    return keep, sources
+
+
+_skip_stats = {'frames': 0, 'skipped': 0, 'saved_ms': 0.0}
+_processed_ms = 0.0  # moving average time of a frame that was not skipped
+_skip_lock = threading.Lock()
+
+
+def frame_skip_stats():
+    """Frames seen, near-duplicates skipped and the estimated processing time saved."""
+    with _skip_lock:
+        stats = dict(_skip_stats)
+    stats['skip_rate'] = stats['skipped'] / stats['frames'] if stats['frames'] else 0.0
+    stats['saved_ms'] = round(stats['saved_ms'], 1)
+    return stats
+
+
+# Stands in for the recognized name of a frame that repeats the last processed one
+_REUSED = object()
+
+
+def _run_recognition(frames, expected_user, state):
+    """Recognize ``frames``; frames that barely changed since the last processed one come back as _REUSED."""
+    global _processed_ms
+    keep, sources = _dedupe_frames(frames, state)
+    names = {}
+    if keep:
+        start = time.perf_counter()
+        error, fresh = _dispatch_recognition([frames[i] for i in keep], expected_user, state)
+        if error:
+            return error, None
+        names = dict(zip(keep, fresh))
+        with _skip_lock:
+            _processed_ms = 0.8 * _processed_ms + 0.2 * ((time.perf_counter() - start) * 1000.0 / len(keep))
+
+    skipped = len(frames) - len(keep)
+    with _skip_lock:
+        _skip_stats['frames'] += len(frames)
+        _skip_stats['skipped'] += skipped
+        _skip_stats['saved_ms'] += skipped * _processed_ms
+    return None, [_REUSED if src < 0 else names[src] for src in sources]
+
+
+_frame_ms = 0.0  # moving average of detection + matching time per frame
+_active = 0  # recognitions running right now
+_load_lock = threading.Lock()
+
+
+def pacing_hints(expected_user):
+    """How the client should send its next frames: interval, capture width, JPEG quality, face stability."""
+    state = _user_states.get(expected_user, {})
+    with _load_lock:
+        frame_ms, active = _frame_ms, _active
+
+    interval = PACE_MIN_MS if state.get('face_box') else PACE_IDLE_MS
+    # Leave the server idle at least half the time with every busy client sending at this rate
+    interval = min(max(interval, int(frame_ms * (active + 1) * 2)), PACE_MAX_MS)
+    return {
+        "interval_ms": interval,
+        "width": DETECTION_PROFILE.width or 0,  # 0 = native camera width
+        "quality": 0.6 if interval >= PACE_MAX_MS else 0.8,
+        "stable": bool(state.get('box_stable')),
+    }
+
+
+def recognize_frame(frame, expected_user):
+    return recognize_frames([frame], expected_user)[0]
+
+
+def recognize_frames(frames, expected_user):
+    """Recognize a short burst of frames from one user with a single neighbour query.
+
+    Faces are detected per frame, the crops are stacked into one probe
+    matrix and scored together, then the confirm/mismatch state machine runs
+    over the frames in order. Returns one result per frame, stopping after
+    the first final result (recorded, denied or failed). With
+    RECOGNIZER_PROCESSES set, detection and scoring run in a worker process.
+    """
+    global _frame_ms, _active
+    state = _user_state(expected_user)
+    with _load_lock:
+        _active += 1
+    start = time.perf_counter()
+    try:
+        error, names = _run_recognition(frames, expected_user, state)
+    finally:
+        with _load_lock:
+            _active -= 1
+            _frame_ms = 0.8 * _frame_ms + 0.2 * ((time.perf_counter() - start) * 1000.0 / max(len(frames), 1))
+    if error:
+        return [error]
+
+    results = []
+    for recognized in names:
+        if recognized is _REUSED:
+            # A repeated frame is not independent evidence: answer as before without
+            # touching the confirm/mismatch counters
+            result = state['last_result']
+            if _is_final(result):
+                result = {"status": "Recognition in progress"}
+        else:
+            if recognized is None:
+                result = {"status": "No face detected"}
+            else:
+                result = _apply_decision(state, expected_user, *recognized)
+            state['last_result'] = result
+        results.append(result)
+        if _is_final(result):
+            break
+    return results
+
+
+def _detect_all_faces(frame):
+    """Boxes (x, y, w, h) of every face in ``frame``."""
+    import cv2
+
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    with _detectors.checkout() as cascade:
+        return DETECTION_PROFILE.detect(cascade, gray, 1.1, 5)
+
+
+def _crop_probes(frame, boxes):
+    """50x50 crops of ``boxes`` stacked into one probe matrix (None for no boxes)."""
+    import cv2
+
+    crops = [cv2.resize(frame[y:y+h, x:x+w, :], (50, 50)).reshape(-1) for x, y, w, h in boxes]
+    return np.vstack(crops) if crops else None
+
+
+def _verify_group(matcher, probes):
+    """``(label, accepted, distance, impostor_distance)`` per probe row.
+
+    One 1:N query labels every face, then each label's faces are verified
+    together against that person's samples and the impostor set.
+    """
+    labels = matcher.predict(probes)
+    verified = [None] * len(probes)
+    for label in set(labels.tolist()):
+        rows = np.flatnonzero(labels == label)
+        verdicts = matcher.verify_batch(probes[rows], label, max_distance=VERIFY_MAX_DISTANCE)
+        for row, (accepted, distance, _, impostor_distance) in zip(rows.tolist(), verdicts):
+            verified[row] = (str(label), accepted, distance, impostor_distance)
+    return verified
+
+
+def recognize_group(frame):
+    """Check in every confidently recognized face in ``frame`` at once.
+
+    All faces are cropped and scored together. Each person is recorded at
+    most once per frame (their closest face) and only when allowed and out
+    of their own attendance cooldown. Returns ``{"faces": [...], "recorded": [...]}``
+    with a box, name and status for every detected face.
+    """
+    _maybe_reload_gallery()
+    matcher = _knn
+    error = _not_ready_error(matcher)
+    if error:
+        return error
+
+    boxes = _detect_all_faces(frame)
+    probes = _crop_probes(frame, boxes)
+    if probes is None:
+        return {"faces": [], "recorded": [], "status": "No face detected"}
+
+    identified = []
+    for label, accepted, distance, impostor_distance in _verify_group(matcher, probes):
+        ratio = _distance_ratio(distance, impostor_distance)
+        identified.append((label if accepted and ratio <= GROUP_CONFIDENT_RATIO else None, ratio))
+    closest = {}
+    for i, (name, ratio) in enumerate(identified):
+        if name is not None and (name not in closest or ratio < identified[closest[name]][1]):
+            closest[name] = i
+
+    faces, recorded = [], []
+    for i, (box, (name, _)) in enumerate(zip(boxes, identified)):
+        if name is None:
+            status = "unknown"
+        elif closest[name] != i:
+            status = "duplicate"
+        elif not _is_user_allowed(name):
+            status = "not_allowed"
+        elif not _should_log(name):
+            status = "cooldown"
+        else:
+            _write_attendance(name)
+            recorded.append(name)
+            status = "recorded"
+        faces.append({"box": [int(v) for v in box], "name": name, "status": status})
+    return {"faces": faces, "recorded": recorded}
+
+
+class RecognitionSession:
+    """Recognition pipeline for one long-lived camera connection.
+
+    ``submit`` hands over encoded frames as they arrive. A worker thread
+    decodes and recognizes the newest one, dropping any frame overtaken
+    while it was busy, and puts each result on ``results``. A final result
+    (recorded, denied or failed) ends the session; ``None`` on ``results``
+    marks the end.
+    """
+
+    def __init__(self, expected_user, decode=None):
+        self.expected_user = expected_user
+        self._decode = decode or (lambda data: detection.decode_frame(data, DETECTION_PROFILE))
+        self._pending = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self.results = queue.Queue()
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, data):
+        """Queue an encoded frame, replacing one still waiting; False once the session has ended."""
+        with self._cond:
+            if self._closed:
+                return False
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = data
+            self.received += 1
+            self._cond.notify()
+        return True
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        return {"received": self.received, "processed": self.processed, "dropped": self.dropped}
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    break
+                data, self._pending = self._pending, None
+            try:
+                frame = self._decode(data)
+                result = {"status": "Failed to decode image"} if frame is None else recognize_frame(frame, self.expected_user)
+            except Exception as e:
+                print(f"[ERROR] Recognition session for {self.expected_user}: {e}")
+                result = {"status": "Recognition error"}
+            self.processed += 1
+            self.results.put(result)
+            if _is_final(result):
+                self.close()
+        self.results.put(None)
+
+
 # User access control functions
 _ALLOWED_USERS_FILE = os.path.join(DATA_DIR, 'allowed_users.pkl')
 _ACCESS_REQUESTS_FILE = os.path.join(DATA_DIR, 'access_requests.pkl')
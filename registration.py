@@ -5,6 +5,10 @@ import os
 import threading
 import time
 
+import detection
+import gallery
+import recognizer
+
 # Registration state
 _registration_running = threading.Event()
 _registration_thread = None
@@ -15,6 +19,69 @@ _reg_frame_lock = threading.Lock()
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 CASCADE_PATH = os.path.join(DATA_DIR, 'haarcascade_frontalface_default.xml')
+# Detection resolution and face-size bounds for the capture loop (see detection.py)
+DETECTION_PROFILE = detection.get_profile(os.environ.get('REGISTRATION_DETECTION_PROFILE'))
+
+# Cascade passes tried on each capture frame: (name, equalize, scaleFactor, minNeighbors, minSize)
+CAPTURE_STRATEGIES = [
+    ('equalized-1.05', True, 1.05, 2, (30, 30)),
+    ('raw-1.05', False, 1.05, 2, (30, 30)),
+    ('equalized-1.03', True, 1.03, 1, (20, 20)),
+    ('raw-1.02', False, 1.02, 1, (20, 20)),
+]
+# A strategy with no hits after this many tries is only retried every STRATEGY_RETRY_EVERY frames
+STRATEGY_DEMOTE_AFTER = 20
+STRATEGY_RETRY_EVERY = 10
+
+
+class _StrategyStats:
+    """Per-session record of which capture strategies find faces, and how fast."""
+
+    def __init__(self, strategies):
+        self.strategies = list(strategies)
+        self.tries = {s[0]: 0 for s in self.strategies}
+        self.hits = {s[0]: 0 for s in self.strategies}
+        self.seconds = {s[0]: 0.0 for s in self.strategies}
+        self.frames = 0
+
+    def _cost_per_hit(self, strategy):
+        name = strategy[0]
+        hit_rate = (self.hits[name] + 1.0) / (self.tries[name] + 2.0)
+        mean_time = self.seconds[name] / self.tries[name] if self.tries[name] else 0.0
+        return mean_time / hit_rate
+
+    def order(self):
+        """Strategies for the next frame, cheapest expected time per hit first; dead ones mostly skipped."""
+        self.frames += 1
+        ranked = sorted(self.strategies, key=self._cost_per_hit)
+        return [s for s in ranked
+                if self.hits[s[0]] or self.tries[s[0]] < STRATEGY_DEMOTE_AFTER
+                or self.frames % STRATEGY_RETRY_EVERY == 0]
+
+    def record(self, name, found, seconds):
+        self.tries[name] += 1
+        self.hits[name] += int(found)
+        self.seconds[name] += seconds
+
+    def summary(self):
+        return ', '.join(f"{s[0]} {self.hits[s[0]]}/{self.tries[s[0]]} "
+                         f"({self.seconds[s[0]] / max(self.tries[s[0]], 1) * 1000:.1f} ms)"
+                         for s in self.strategies)
+
+
+def _detect_with_strategies(facedetect, gray, stats):
+    """Run the capture strategies in the order ``stats`` suggests until one finds a face."""
+    gray_eq = None
+    for name, equalize, scale_factor, min_neighbors, min_size in stats.order():
+        start = time.perf_counter()
+        if equalize and gray_eq is None:
+            gray_eq = cv2.equalizeHist(gray)
+        faces = DETECTION_PROFILE.detect(facedetect, gray_eq if equalize else gray,
+                                         scale_factor, min_neighbors, min_size=min_size)
+        stats.record(name, len(faces) > 0, time.perf_counter() - start)
+        if len(faces):
+            return faces
+    return ()
 
 
 def _capture_faces(name: str):
@@ -87,6 +154,8 @@ def _capture_faces(name: str):
 
         faces_data = []
         i = 0
+        stats = _StrategyStats(CAPTURE_STRATEGIES)
+        started = time.perf_counter()
 
         while _registration_running.is_set() and len(faces_data) < 100:
             ret, frame = video.read()
@@ -99,19 +168,8 @@ def _capture_faces(name: str):
 
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
-            # Try multiple detection strategies - START VERY AGGRESSIVE
-            gray_eq = cv2.equalizeHist(gray)
-            faces = facedetect.detectMultiScale(gray_eq, scaleFactor=1.05, minNeighbors=2, minSize=(30, 30))
-
-            # Fallback strategies if no face detected
-            if len(faces) == 0:
-                faces = facedetect.detectMultiScale(gray, scaleFactor=1.05, minNeighbors=2, minSize=(30, 30))
-
-            if len(faces) == 0:
-                faces = facedetect.detectMultiScale(gray_eq, scaleFactor=1.03, minNeighbors=1, minSize=(20, 20))
-
-            if len(faces) == 0:
-                faces = facedetect.detectMultiScale(gray, scaleFactor=1.02, minNeighbors=1, minSize=(20, 20))
+            # Try the detection strategies, the one that has been working best this session first
+            faces = _detect_with_strategies(facedetect, gray, stats)
 
             for (x, y, w, h) in faces:
                 crop_img = frame[y:y+h, x:x+w, :]
@@ -120,6 +178,8 @@ def _capture_faces(name: str):
                     faces_data.append(resized_img)
                     with _registration_lock:
                         _registration_progress["current"] = len(faces_data)
+                        _registration_progress["ms_per_sample"] = round(
+                            (time.perf_counter() - started) / len(faces_data) * 1000.0, 1)
                 i += 1
 
                 # Draw rectangle and progress on display frame
@@ -135,6 +195,10 @@ def _capture_faces(name: str):
 
         video.release()
         cv2.destroyAllWindows()
+        if faces_data:
+            print(f"[REG] {len(faces_data)} samples in {time.perf_counter() - started:.1f}s "
+                  f"({(time.perf_counter() - started) / len(faces_data) * 1000:.0f} ms/sample); "
+                  f"strategies: {stats.summary()}")
 
         if len(faces_data) < 100:
             with _registration_lock:
@@ -148,31 +212,14 @@ def _capture_faces(name: str):
         faces_data = np.asarray(faces_data)
         faces_data = faces_data.reshape(100, -1)
 
-        names_path = os.path.join(DATA_DIR, 'names.pkl')
-        faces_path = os.path.join(DATA_DIR, 'faces_data.pkl')
-
-        # Save names
-        if not os.path.isfile(names_path):
-            names = [name] * 100
-            with open(names_path, 'wb') as f:
-                pickle.dump(names, f)
-        else:
-            with open(names_path, 'rb') as f:
-                names = pickle.load(f)
-            names = names + [name] * 100
-            with open(names_path, 'wb') as f:
-                pickle.dump(names, f)
-
-        # Save faces
-        if not os.path.isfile(faces_path):
-            with open(faces_path, 'wb') as f:
-                pickle.dump(faces_data, f)
-        else:
-            with open(faces_path, 'rb') as f:
-                faces = pickle.load(f)
-            faces = np.append(faces, faces_data, axis=0)
-            with open(faces_path, 'wb') as f:
-                pickle.dump(faces, f)
+        # Append to the gallery (migrating the legacy pickles first so no samples are lost)
+        published_faces, published_labels = gallery.enroll(faces_data, name)
+
+        # Make the new user recognizable right away
+        try:
+            recognizer.add_samples(published_faces, published_labels)
+        except Exception as e:
+            print(f"[REG] Saved samples but could not update the live recognizer: {e}")
 
         with _registration_lock:
             _registration_progress = {"current": 100, "total": 100, "status": "completed", "name": name}
@@ -0,0 +1,45 @@
+"""Load (or rebuild from) the Attendance/ CSV files into the attendance store, or export a day back to CSV.
+
+Usage: python scripts/attendance_db.py import [--dir Attendance]
+       python scripts/attendance_db.py rebuild [--dir Attendance]
+       python scripts/attendance_db.py export DD-MM-YYYY [--out file.csv]
+"""
+import os
+import sys
+import argparse
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import attendance_store  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import or export attendance records')
+    sub = parser.add_subparsers(dest='command', required=True)
+    imp = sub.add_parser('import', help='Add every Attendance_DD-MM-YYYY.csv to the store (rows already present are skipped)')
+    imp.add_argument('--dir', default=attendance_store.DEFAULT_CSV_DIR)
+    reb = sub.add_parser('rebuild', help='Replace the store (and its per-day and per-user indexes) with the CSV contents')
+    reb.add_argument('--dir', default=attendance_store.DEFAULT_CSV_DIR)
+    exp = sub.add_parser('export', help='Write one day in the Attendance_DD-MM-YYYY.csv layout')
+    exp.add_argument('date', help='DD-MM-YYYY')
+    exp.add_argument('--out', help='Output file (default: stdout)')
+    args = parser.parse_args()
+
+    store = attendance_store.AttendanceStore(attendance_store.DEFAULT_DB_PATH)
+    if args.command == 'import':
+        files, added = store.import_csv_dir(args.dir)
+        print(f'Done: {added} new check-ins from {files} files in {store.path}')
+    elif args.command == 'rebuild':
+        files, added = store.rebuild(args.dir)
+        print(f'Done: rebuilt {store.path} with {added} check-ins from {files} files')
+    elif args.out:
+        with open(args.out, 'w', newline='', encoding='utf-8') as f:
+            store.export_csv(args.date, f)
+        print(f'Wrote {store.count(args.date)} check-ins to {args.out}')
+    else:
+        store.export_csv(args.date, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
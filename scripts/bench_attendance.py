@@ -0,0 +1,80 @@
+"""Attendance lookups: scanning the daily CSV files vs the indexed SQLite store.
+
+Writes synthetic history (--days x --users check-ins) to a temporary
+directory, imports it and times a per-day listing, one user's day and
+one user's check-ins across every day.
+
+Usage: python scripts/bench_attendance.py [--days 180] [--users 500] [--repeat 20]
+"""
+import os
+import sys
+import csv
+import time
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import attendance_store  # noqa: E402
+
+
+def _read_csv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return [row for row in csv.reader(f) if row][1:]
+
+
+def _timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000.0, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark attendance reads from CSV files and the SQLite store')
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='attendance-bench-')
+    csv_dir = os.path.join(tmp, 'Attendance')
+    os.makedirs(csv_dir)
+    first = datetime(2026, 1, 1, 9, 0, 0)
+    for d in range(args.days):
+        day = first + timedelta(days=d)
+        with open(os.path.join(csv_dir, f"Attendance_{day.strftime('%d-%m-%Y')}.csv"), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['NAME', 'TIME'])
+            for u in range(args.users):
+                writer.writerow([f'user{u:04d}', (day + timedelta(seconds=u * 7)).strftime('%H:%M:%S')])
+
+    store = attendance_store.AttendanceStore(os.path.join(tmp, 'attendance.db'))
+    start = time.perf_counter()
+    files, added = store.import_csv_dir(csv_dir)
+    print(f'Imported {added} check-ins from {files} files in {time.perf_counter() - start:.2f} s')
+
+    day = (first + timedelta(days=args.days // 2)).strftime('%d-%m-%Y')
+    day_path = os.path.join(csv_dir, f'Attendance_{day}.csv')
+    user = f'user{args.users // 2:04d}'
+    all_paths = [os.path.join(csv_dir, name) for name in sorted(os.listdir(csv_dir))]
+    cases = [
+        ('one day', lambda: _read_csv(day_path), lambda: store.day(day)),
+        ('one user, one day', lambda: [r for r in _read_csv(day_path) if r[0] == user], lambda: store.day(day, name=user)),
+        ('one user, all days', lambda: [r for p in all_paths for r in _read_csv(p) if r[0] == user],
+         lambda: store._connect().execute('SELECT ts FROM attendance WHERE name = ? ORDER BY ts', (user,)).fetchall()),
+    ]
+    print(f'{"lookup":<20} {"csv ms":>9} {"store ms":>9} {"rows":>6}')
+    for label, scan, indexed in cases:
+        repeat = 1 if label.endswith('all days') else args.repeat
+        scan_ms, rows = _timed(scan, repeat)
+        store_ms, store_rows = _timed(indexed, args.repeat)
+        assert rows == store_rows, (label, rows, store_rows)
+        print(f'{label:<20} {scan_ms:>9.2f} {store_ms:>9.3f} {rows:>6}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
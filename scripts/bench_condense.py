@@ -0,0 +1,57 @@
+"""Report recall and query time of condensed galleries against the full raw gallery.
+
+Every fifth sample of each identity is held out as a probe; the rest form
+the gallery, which is then condensed to K prototypes per identity.
+
+Usage: python scripts/bench_condense.py [--prototypes 5 10 20]
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import gallery  # noqa: E402
+from recognizer import FaceMatcher  # noqa: E402
+
+
+def _evaluate(faces, labels, probes, probe_labels):
+    matcher = FaceMatcher(n_neighbors=3).fit(faces, labels)
+    start = time.perf_counter()
+    predicted = np.concatenate([matcher.predict(p.reshape(1, -1)) for p in probes])
+    ms = (time.perf_counter() - start) / len(probes) * 1000.0
+    return predicted, np.mean(predicted == probe_labels), ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark gallery condensation')
+    parser.add_argument('--prototypes', type=int, nargs='+', default=[3, 5, 10, 20])
+    args = parser.parse_args()
+
+    if not gallery.ensure_gallery():
+        print('No gallery found; enroll some faces first.')
+        return
+    faces, labels = gallery.load()
+    faces = np.asarray(faces)
+    labels = np.asarray(labels, dtype=object)
+    held_out = (np.arange(len(labels)) % 5) == 0
+    train_faces, train_labels = faces[~held_out], labels[~held_out]
+    probes, probe_labels = faces[held_out], labels[held_out]
+
+    baseline, recall, ms = _evaluate(train_faces, list(train_labels), probes, probe_labels)
+    print(f'full gallery: {len(train_labels)} rows, recall {recall:.1%}, {ms:.2f} ms/query')
+
+    for k in args.prototypes:
+        proto_faces, proto_labels = gallery.condense(train_faces, train_labels, k)
+        predicted, recall, ms = _evaluate(proto_faces, proto_labels, probes, probe_labels)
+        agreement = np.mean(predicted == baseline)
+        print(f'{k:3d} prototypes/identity: {len(proto_labels)} rows, recall {recall:.1%}, '
+              f'agreement with full {agreement:.1%}, {ms:.2f} ms/query')
+
+
+if __name__ == '__main__':
+    main()
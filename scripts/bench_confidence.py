@@ -0,0 +1,95 @@
+"""Replay held-out gallery samples through the confirm/mismatch state machine.
+
+The first part of each person's samples builds the matcher and the rest
+are replayed as camera frames. Genuine runs claim the frames' own
+identity; impostor runs claim somebody else's. Reports the mean number of
+frames per decision and the error counts with the distance-aware
+confidence policy on and off.
+
+Usage: python scripts/bench_confidence.py [--train 0.7] [--runs 200] [--noise 6]
+"""
+import os
+import sys
+import argparse
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import gallery  # noqa: E402
+import recognizer  # noqa: E402
+
+MAX_FRAMES = 20
+
+
+def _replay(matcher, frames, claimed):
+    """Frames consumed and the outcome ('accepted', 'rejected' or 'undecided') of one check-in."""
+    state = {'confirm_count': 0, 'mismatch_count': 0, 'mismatch_name': None}
+    names = recognizer._identify(matcher, frames, claimed)
+    for used, (name, weight) in enumerate(names, 1):
+        result = recognizer._apply_decision(state, claimed, name, weight)
+        if result.get('attendance_recorded'):
+            return used, 'accepted'
+        if result.get('recognition_failed'):
+            return used, 'rejected'
+    return len(names), 'undecided'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark frames per decision under the confidence policy')
+    parser.add_argument('--train', type=float, default=0.7, help='Fraction of each identity used as the gallery')
+    parser.add_argument('--runs', type=int, default=200, help='Genuine and impostor check-ins each')
+    parser.add_argument('--noise', type=float, default=6.0, help='Gaussian pixel noise added to replayed frames')
+    args = parser.parse_args()
+
+    _, faces, labels = gallery.load_snapshot(gallery.active_root())
+    faces = np.asarray(faces, dtype=np.float32)
+    labels = np.asarray([str(label) for label in labels])
+    identities = sorted(set(labels))
+    if len(identities) < 2:
+        print('Need at least two enrolled identities')
+        return 1
+
+    train, held_out = [], {}
+    for name in identities:
+        rows = np.flatnonzero(labels == name)
+        cut = max(int(len(rows) * args.train), 1)
+        train.extend(rows[:cut].tolist())
+        held_out[name] = rows[cut:]
+    # Fitted here rather than via _build_matcher so the gallery's saved projection is left alone
+    projection = None
+    if recognizer.PCA_COMPONENTS > 0:
+        projection = recognizer.Projection.fit(faces[train], recognizer.PCA_COMPONENTS, whiten=recognizer.PCA_WHITEN)
+    matcher = recognizer.FaceMatcher(projection=projection).fit(faces[train], labels[train])
+
+    # Check-ins never hit the attendance files or the allow list
+    recognizer._is_user_allowed = lambda name: True
+    recognizer._should_log = lambda name: True
+    recognizer._write_attendance = lambda name: None
+
+    rng = np.random.default_rng(0)
+    plans = []
+    for _ in range(args.runs):
+        actual = identities[rng.integers(len(identities))]
+        impostor_claim = rng.choice([n for n in identities if n != actual])
+        rows = rng.choice(held_out[actual], MAX_FRAMES)
+        frames = np.clip(faces[rows] + rng.normal(0, args.noise, (MAX_FRAMES, faces.shape[1])), 0, 255)
+        plans.append((frames, actual, impostor_claim))
+
+    print(f'{len(identities)} identities, {len(train)} gallery rows, {args.runs} genuine + {args.runs} impostor check-ins')
+    for enabled in (False, True):
+        recognizer.CONFIDENCE_POLICY = enabled
+        genuine = [_replay(matcher, frames, actual) for frames, actual, _ in plans]
+        impostor = [_replay(matcher, frames, claim) for frames, _, claim in plans]
+        frames_used = [used for used, outcome in genuine + impostor if outcome != 'undecided']
+        print(f"policy {'on ' if enabled else 'off'}: {np.mean(frames_used):.2f} frames/decision "
+              f"(genuine {np.mean([u for u, _ in genuine]):.2f}, impostor {np.mean([u for u, _ in impostor]):.2f}), "
+              f"false rejects {sum(o == 'rejected' for _, o in genuine)}, "
+              f"false accepts {sum(o == 'accepted' for _, o in impostor)}, "
+              f"undecided {sum(o == 'undecided' for _, o in genuine + impostor)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""Time the Haar cascade under each detection profile.
+
+Without --image the frame is synthetic: a gallery sample scaled up and
+pasted into a blank 640x480 frame (the browser camera size).
+
+Usage: python scripts/bench_detection.py [--image frame.jpg] [--repeat 30] [--profiles full balanced fast]
+"""
+import os
+import sys
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import detection  # noqa: E402
+import gallery  # noqa: E402
+import recognizer  # noqa: E402
+
+
+def _synthetic_frame(face_px):
+    """First gallery sample the cascade finds once pasted into a 640x480 frame."""
+    _, faces, _ = gallery.load_snapshot(gallery.active_root())
+    frame = np.full((480, 640, 3), 120, dtype=np.uint8)
+    top, left = (480 - face_px) // 2, (640 - face_px) // 2
+    for i in range(0, len(faces), max(len(faces) // 50, 1)):
+        candidate = frame.copy()
+        candidate[top:top + face_px, left:left + face_px] = cv2.resize(np.asarray(faces[i]).reshape(50, 50, 3), (face_px, face_px))
+        gray = cv2.cvtColor(candidate, cv2.COLOR_BGR2GRAY)
+        with recognizer._detectors.checkout() as cascade:
+            found = len(detection.PROFILES['full'].detect(cascade, gray))
+        if found:
+            return candidate
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark face detection profiles')
+    parser.add_argument('--image', help='Frame to detect in (default: synthetic 640x480 frame)')
+    parser.add_argument('--face-px', type=int, default=200, help='Face size in the synthetic frame')
+    parser.add_argument('--repeat', type=int, default=30, help='Detections per profile')
+    parser.add_argument('--profiles', nargs='+', default=list(detection.PROFILES))
+    args = parser.parse_args()
+
+    if recognizer._detectors is None:
+        print('Face detection cascade not loaded')
+        return 1
+    frame = cv2.imread(args.image) if args.image else _synthetic_frame(args.face_px)
+    if frame is None:
+        print('No usable frame (pass --image)')
+        return 1
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    print(f'{frame.shape[1]}x{frame.shape[0]} frame, {args.repeat} detections per profile')
+    for name in args.profiles:
+        profile = detection.get_profile(name)
+        with recognizer._detectors.checkout() as cascade:
+            profile.detect(cascade, gray)  # warm-up
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                faces = profile.detect(cascade, gray, 1.1, 5)
+        ms = (time.perf_counter() - start) / args.repeat * 1000.0
+        boxes = ', '.join(str(tuple(int(v) for v in f)) for f in faces) or 'none'
+        print(f'{name:>9}: {ms:7.2f} ms/frame, faces: {boxes}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""Detection throughput (frames/sec) against thread count: pooled classifiers vs one locked classifier.
+
+Usage: python scripts/bench_detector_pool.py [--image frame.jpg] [--frames 120] [--threads 1 2 4 8]
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import cv2
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import detection  # noqa: E402
+import recognizer  # noqa: E402
+from bench_detection import _synthetic_frame  # noqa: E402
+
+
+class _LockedCascade:
+    """The old arrangement: one classifier shared by every thread, serialized by a lock."""
+
+    def __init__(self, pool):
+        with pool.checkout() as cascade:
+            self._cascade = cascade
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def checkout(self):
+        with self._lock:
+            yield self._cascade
+
+
+def _throughput(detectors, gray, frames, threads):
+    profile = detection.get_profile()
+
+    def work(_):
+        with detectors.checkout() as cascade:
+            profile.detect(cascade, gray, 1.1, 5)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(work, range(threads)))  # warm-up, creates pooled instances
+        start = time.perf_counter()
+        list(pool.map(work, range(frames)))
+    return frames / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the detector pool against thread count')
+    parser.add_argument('--image', help='Frame to detect in (default: synthetic 640x480 frame)')
+    parser.add_argument('--frames', type=int, default=120, help='Detections per measurement')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    if recognizer._detectors is None:
+        print('Face detection cascade not loaded')
+        return 1
+    frame = cv2.imread(args.image) if args.image else _synthetic_frame(200)
+    if frame is None:
+        print('No usable frame (pass --image)')
+        return 1
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    print(f'{os.cpu_count()} CPUs, profile {detection.get_profile().name}, {args.frames} frames per run')
+    print(f'{"threads":>7} {"pool fps":>9} {"locked fps":>11}')
+    for threads in args.threads:
+        pool = detection.DetectorPool(recognizer._detectors._xml, size=threads)
+        pooled = _throughput(pool, gray, args.frames, threads)
+        locked = _throughput(_LockedCascade(pool), gray, args.frames, threads)
+        print(f'{threads:>7} {pooled:>9.1f} {locked:>11.1f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
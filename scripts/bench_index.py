@@ -0,0 +1,45 @@
+"""Build each face_index backend on a synthetic gallery and report recall@k and latency.
+
+Usage: python scripts/bench_index.py [--samples 20000] [--dim 128] [--backends exact lsh hnsw]
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import face_index  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark nearest-neighbour index backends')
+    parser.add_argument('--samples', type=int, default=20000, help='Gallery rows')
+    parser.add_argument('--identities', type=int, default=200, help='Clusters in the synthetic gallery')
+    parser.add_argument('--dim', type=int, default=128, help='Embedding size (PCA_COMPONENTS)')
+    parser.add_argument('--queries', type=int, default=200, help='Probe vectors')
+    parser.add_argument('-k', type=int, default=3, help='Neighbours per query')
+    parser.add_argument('--backends', nargs='+', default=list(face_index.BACKENDS))
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centres = rng.standard_normal((args.identities, args.dim)).astype(np.float32) * 10
+    vectors = centres[np.arange(args.samples) % args.identities] + rng.standard_normal((args.samples, args.dim)).astype(np.float32) * 3
+    queries = vectors[rng.integers(0, args.samples, args.queries)] + rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+    truth = face_index.BruteForceIndex().build(vectors).query(queries, args.k)[1]
+    print(f'{args.samples} x {args.dim}-d vectors, {args.queries} queries, k={args.k}')
+    for kind in args.backends:
+        start = time.perf_counter()
+        index = face_index.make_index(kind).build(vectors)
+        build_s = time.perf_counter() - start
+        report = face_index.evaluate(index, queries, args.k, truth=truth)
+        print(f'{kind:>6}: build {build_s:7.2f} s, recall@{args.k} {report["recall"]:.1%}, '
+              f'{report["ms_per_query"]:.2f} ms/query')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Compare per-query latency of recognizer.FaceMatcher against sklearn's KNN.
+
+Usage: python scripts/bench_matcher.py [--samples 3000] [--queries 200]
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from recognizer import FaceMatcher, Projection, QuantizedFaceMatcher  # noqa: E402
+
+
+def _time_per_query(predict, queries):
+    start = time.perf_counter()
+    for q in queries:
+        predict(q.reshape(1, -1))
+    return (time.perf_counter() - start) / len(queries) * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the face matcher')
+    parser.add_argument('--samples', type=int, default=3000, help='Gallery rows')
+    parser.add_argument('--identities', type=int, default=30, help='Distinct labels')
+    parser.add_argument('--queries', type=int, default=200, help='Probe frames')
+    parser.add_argument('--pca', type=int, default=128, help='Projection size to compare (0 to skip)')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centres = rng.integers(0, 256, size=(args.identities, 7500))
+    labels = [f'user{i % args.identities}' for i in range(args.samples)]
+    noise = rng.integers(-40, 41, size=(args.samples, 7500))
+    faces = np.clip(centres[np.arange(args.samples) % args.identities] + noise, 0, 255).astype(np.uint8)
+    queries = np.clip(faces[rng.integers(0, args.samples, args.queries)].astype(int)
+                      + rng.integers(-20, 21, size=(args.queries, 7500)), 0, 255).astype(np.uint8)
+
+    matcher = FaceMatcher(n_neighbors=3).fit(faces, labels)
+    ms = _time_per_query(matcher.predict, queries)
+    print(f'FaceMatcher: {ms:.2f} ms/query on {args.samples} samples')
+
+    if args.pca:
+        projected = FaceMatcher(n_neighbors=3, projection=Projection.fit(faces, args.pca)).fit(faces, labels)
+        pca_ms = _time_per_query(projected.predict, queries)
+        agree = np.mean(projected.predict(queries) == matcher.predict(queries))
+        print(f'FaceMatcher + {args.pca}-d PCA: {pca_ms:.2f} ms/query, gallery '
+              f'{projected._gallery.nbytes / 1e6:.1f} MB vs {matcher._gallery.nbytes / 1e6:.1f} MB, '
+              f'label agreement {agree:.1%}')
+
+    quantized = QuantizedFaceMatcher(n_neighbors=3).fit(faces, labels)
+    q_ms = _time_per_query(quantized.predict, queries)
+    agree = np.mean(quantized.predict(queries) == matcher.predict(queries))
+    print(f'QuantizedFaceMatcher (int8): {q_ms:.2f} ms/query, gallery '
+          f'{quantized._gallery.nbytes / 1e6:.1f} MB, label agreement {agree:.1%}')
+
+    try:
+        from sklearn.neighbors import KNeighborsClassifier
+    except ImportError:
+        print('scikit-learn not installed; skipping baseline')
+        return
+
+    knn = KNeighborsClassifier(n_neighbors=3).fit(faces, labels)
+    base_ms = _time_per_query(knn.predict, queries)
+    agree = np.mean(matcher.predict(queries) == knn.predict(queries))
+    print(f'KNeighborsClassifier: {base_ms:.2f} ms/query ({base_ms / ms:.1f}x slower), '
+          f'label agreement {agree:.1%}')
+
+
+if __name__ == '__main__':
+    main()
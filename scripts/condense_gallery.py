@@ -0,0 +1,29 @@
+"""Rebuild data/gallery/prototypes/ from the raw samples in data/gallery/.
+
+Usage: python scripts/condense_gallery.py --per-identity 10
+"""
+import os
+import sys
+import argparse
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import gallery  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Condense each identity to a few prototype samples')
+    parser.add_argument('--per-identity', type=int, default=gallery.PROTOTYPES_PER_IDENTITY or 10,
+                        help='Prototypes kept per identity (default: GALLERY_PROTOTYPES or 10)')
+    args = parser.parse_args()
+
+    if not gallery.ensure_gallery():
+        print('No gallery found; enroll some faces first.')
+        return
+    gallery.rebuild_prototypes(args.per_identity)
+    print('Set GALLERY_PROTOTYPES to the same value so the recognizer matches against the prototypes.')
+
+
+if __name__ == '__main__':
+    main()
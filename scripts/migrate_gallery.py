@@ -0,0 +1,28 @@
+"""Convert data/names.pkl + data/faces_data.pkl into the memory-mapped gallery format.
+
+Usage: python scripts/migrate_gallery.py [--force]
+"""
+import os
+import sys
+import argparse
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import gallery  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrate the pickled face data to data/gallery/')
+    parser.add_argument('--force', action='store_true', help='Overwrite an existing gallery')
+    args = parser.parse_args()
+
+    if gallery.exists() and not args.force:
+        print(f'Gallery already exists at {gallery.GALLERY_DIR}; use --force to rebuild it from the pickles.')
+        return
+    count = gallery.migrate_from_pickles(force=args.force)
+    print(f'Done: {count} samples in {gallery.GALLERY_DIR}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Scripted client for the /ws/recognize streaming session.
+
+Logs in over HTTP, opens the WebSocket with the session cookie, streams
+JPEG frames at a fixed rate and prints every result with its latency
+(time since the newest frame was sent) and the server's frame counters.
+
+Usage: python scripts/stream_client.py --user "<name>" [--password ...]
+       [--url http://localhost:8000] [--image face.jpg | --video 0] [--fps 10] [--seconds 10]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import http.cookiejar
+import urllib.parse
+import urllib.request
+
+import cv2
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+
+def _login(url, user, password):
+    """Session cookie header for ``user`` (recognition sessions require a login)."""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    form = urllib.parse.urlencode({'username': user, 'password': password}).encode()
+    opener.open(url.rstrip('/') + '/login', form).read()
+    cookies = '; '.join(f'{c.name}={c.value}' for c in jar)
+    if 'session=' not in cookies:
+        raise RuntimeError(f'Login as {user!r} failed')
+    return cookies
+
+
+def _frames(args):
+    """Yield encoded JPEG frames from --video, --image or a synthetic gallery frame."""
+    if args.video is not None:
+        source = int(args.video) if args.video.isdigit() else args.video
+        video = cv2.VideoCapture(source)
+        try:
+            while True:
+                ok, frame = video.read()
+                if not ok:
+                    return
+                yield cv2.imencode('.jpg', frame)[1].tobytes()
+        finally:
+            video.release()
+    if args.image:
+        frame = cv2.imread(args.image)
+    else:
+        from bench_detection import _synthetic_frame
+        frame = _synthetic_frame(200)
+    if frame is None:
+        raise SystemExit('No usable frame (pass --image or --video)')
+    encoded = cv2.imencode('.jpg', frame)[1].tobytes()
+    while True:
+        yield encoded
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream frames to /ws/recognize and print the results')
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--user', required=True, help='Registered user to log in as')
+    parser.add_argument('--password', default='', help='Needed for admin users only')
+    parser.add_argument('--image', help='Frame to send repeatedly')
+    parser.add_argument('--video', help='Video file or camera index to stream')
+    parser.add_argument('--fps', type=float, default=10.0, help='Frames sent per second')
+    parser.add_argument('--seconds', type=float, default=10.0, help='Stop after this long')
+    args = parser.parse_args()
+
+    from simple_websocket import Client, ConnectionClosed
+
+    cookie = _login(args.url, args.user, args.password)
+    ws_url = args.url.replace('http', 'ws', 1).rstrip('/') + '/ws/recognize'
+    ws = Client.connect(ws_url, headers={'Cookie': cookie})
+    last_sent = [time.perf_counter()]
+    done = threading.Event()
+
+    def receive():
+        try:
+            while True:
+                result = json.loads(ws.receive())
+                latency = (time.perf_counter() - last_sent[0]) * 1000.0
+                print(f"{latency:7.1f} ms  received {result.get('received')} processed {result.get('processed')} "
+                      f"dropped {result.get('dropped')}  {result.get('message')}")
+        except (ConnectionClosed, TypeError):
+            pass
+        finally:
+            done.set()
+
+    threading.Thread(target=receive, daemon=True).start()
+    deadline = time.perf_counter() + args.seconds
+    try:
+        for data in _frames(args):
+            if done.is_set() or time.perf_counter() > deadline:
+                break
+            last_sent[0] = time.perf_counter()
+            ws.send(data)
+            time.sleep(1.0 / args.fps)
+    finally:
+        try:
+            if not done.is_set():
+                ws.send('close')
+                done.wait(2)
+            ws.close()
+        except ConnectionClosed:
+            pass
+
+
+if __name__ == '__main__':
+    main()
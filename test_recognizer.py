@@ -11,10 +11,11 @@ try:
 
     # Try to access the global variables to trigger loading
     print(f"✅ KNN model loaded: {recognizer._knn is not None}")
-    print(f"✅ Face cascade loaded: {recognizer._face_cascade is not None}")
+    print(f"✅ Face cascade loaded: {recognizer._detectors is not None}")
 
-    if recognizer._face_cascade is not None:
-        print(f"✅ Face cascade is not empty: {not recognizer._face_cascade.empty()}")
+    if recognizer._detectors is not None:
+        with recognizer._detectors.checkout() as cascade:
+            print(f"✅ Face cascade is not empty: {not cascade.empty()}")
 
     print("✅ All components loaded successfully!")
 